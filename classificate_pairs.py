@@ -1,43 +1,69 @@
-import sys
+import argparse
+import hashlib
 import ollama
-import pandas as pd
 import sqlite3
-import re
-import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
 from tqdm import tqdm
 
+from llm_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_MB, open_cache
+from ollama_pool import open_pool
+from pairs_from_phrases import derive_pair_verdicts, derived_response
+from response_parsing import (PAIR_SCHEMA, PAIR_SCORE_SCHEMA, is_negative_label, json_decided, parse_json_pair,
+                              parse_score_choice, parse_tuples, score_confidence, texts_match, tuples_decided)
+from result_writer import ResultWriter
+from retry_policy import DEFAULT_MAX_ATTEMPTS, RetryPolicy, dead_letter_row, dead_letter_writer
+from streaming import stream_generate
+from telemetry import TELEMETRY_COLUMNS, ensure_telemetry_columns, response_telemetry, telemetry_values
+from utils.pair_index import load_pair_index
+
 MODEL_NAME = "llama3" 
 
+# Seed padrão da ordem das frases; com a mesma seed, cada par é sempre mostrado igual
+DEFAULT_ORDER_SEED = 42
+
+STRUCTURED_SYSTEM_PROMPT = 'Responda APENAS com o JSON {"trocadilho": n}, onde n é o número (1 ou 2) da frase que é trocadilho.'
+SCORE_SYSTEM_PROMPT = "Responda APENAS com o número (1 ou 2) da frase que é trocadilho."
+
+PAIR_COLUMNS = [
+    "pair_id", "pun_phrase_gold", "non_pun_phrase_gold", "model_response_raw",
+    "predicted_pun_phrase", "is_correct", "error_flag", "pun_position", "order_seed", "confidence"
+] + TELEMETRY_COLUMNS
+
+# Tokens gerados no modo estruturado; {"trocadilho": 2} cabe com folga
+STRUCTURED_MAX_TOKENS = 16
+
+# Modo de pontuação: um único token (o número da frase), com as log-probabilidades dos mais prováveis
+SCORE_MAX_TOKENS = 1
+SCORE_TOP_LOGPROBS = 5
+SCORE_CHOICES = ("1", "2")
+
 def parse_llm_response(response_text):
     """
     Extrai tuplas (texto, rótulo) lidando corretamente com frases que contêm vírgulas.
     Usa a última vírgula da tupla como separador.
     """
-    raw_matches = re.findall(r"\((.*?)\)", response_text, re.DOTALL)
-    
     predicted_pun = None
     predicted_non_pun = None
     
-    for match in raw_matches:
-        
-        last_comma_index = match.rfind(',')
-        
-        if last_comma_index == -1:
-            continue
-            
-        text_part = match[:last_comma_index].strip()
-        label_part = match[last_comma_index+1:].strip()
-        
-        clean_text = text_part.strip().strip("'").strip('"')
-        clean_label = label_part.strip().strip("'").strip('"').lower()
-        
-        if 'não' in clean_label or 'nao' in clean_label or 'non' in clean_label:
+    for clean_text, clean_label in parse_tuples(response_text):
+        if is_negative_label(clean_label):
             predicted_non_pun = clean_text
         else:
             predicted_pun = clean_text
             
     return predicted_pun, predicted_non_pun
 
+def pair_order(pair_id, seed=DEFAULT_ORDER_SEED):
+    """
+    Posição (1 ou 2) em que a frase trocadilho é mostrada, derivada de
+    `pair_id` e `seed`. Não depende do processo nem da ordem de execução,
+    então o mesmo par gera sempre o mesmo prompt (e acerta o cache).
+    """
+    digest = hashlib.sha256(f"{seed}|{pair_id}".encode("utf-8")).digest()
+    return 1 + digest[0] % 2
+
 def setup_database(db_path):
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
@@ -53,65 +79,219 @@ def setup_database(db_path):
         predicted_pun_phrase TEXT,
         
         is_correct INTEGER, -- 1 se acertou, 0 se errou
-        error_flag INTEGER DEFAULT 0 -- 1 se houve erro de parse
+        error_flag INTEGER DEFAULT 0, -- 1 se houve erro de parse
+
+        pun_position INTEGER, -- 1 ou 2: posição do trocadilho no prompt
+        order_seed INTEGER,
+        confidence REAL -- probabilidade da frase escolhida no modo de pontuação
     )
     """)
     
+    # Bancos anteriores à ordem determinística e ao modo de pontuação
+    existing = {row[1] for row in cursor.execute("PRAGMA table_info(results_pairs)")}
+    for column, type_ in (("pun_position", "INTEGER"), ("order_seed", "INTEGER"), ("confidence", "REAL")):
+        if column not in existing:
+            cursor.execute(f"ALTER TABLE results_pairs ADD COLUMN {column} {type_}")
+    ensure_telemetry_columns(conn, "results_pairs")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_pair_id ON results_pairs (pair_id)")
     conn.commit()
     conn.close()
 
-def get_processed_ids(db_path):
+def get_processed_positions(db_path):
+    """{pair_id: posições já gravadas}; linhas de bancos antigos têm posição None."""
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT pair_id FROM results_pairs")
-        return {row[0] for row in cursor.fetchall()}
+        cursor.execute("SELECT pair_id, pun_position FROM results_pairs")
+        processed = {}
+        for pair_id, position in cursor.fetchall():
+            processed.setdefault(pair_id, set()).add(position)
+        return processed
     except sqlite3.OperationalError:
-        return set()
+        return {}
     finally:
         conn.close()
 
-def process_pairs_csv(csv_path, prompt_template_path, db_path):
+def get_processed_ids(db_path, both_orders=False):
+    """Pares já classificados; com `both_orders`, só os que têm as duas ordens."""
+    processed = get_processed_positions(db_path)
+    if both_orders:
+        return {pair_id for pair_id, positions in processed.items() if {1, 2} <= positions}
+    return set(processed)
+
+def classify_pair(pair_id, gold_pun, gold_non, prompt_instruction, cache=None, structured=False,
+                  max_tokens=STRUCTURED_MAX_TOKENS, stream_abort=False, model=MODEL_NAME, client=None,
+                  order_seed=DEFAULT_ORDER_SEED, pun_position=None, score=False):
+    """
+    Envia um par ao Llama 3 e devolve (linha, telemetria), onde a linha é
+    (pair_id, pun_phrase_gold, non_pun_phrase_gold, model_response_raw,
+     predicted_pun_phrase, is_correct, error_flag, pun_position, order_seed,
+     confidence); ver pair_result_row.
+    A ordem das frases é pair_order(pair_id, order_seed), a menos que
+    `pun_position` (1 ou 2) seja dado.
+    No modo `structured`, o modelo responde {"trocadilho": 1 ou 2} (JSON
+    restrito por esquema, no máximo `max_tokens` tokens) em vez das tuplas.
+    Com `stream_abort`, a geração é cancelada assim que as duas tuplas (ou o
+    JSON) estiverem completas.
+    No modo `score`, o modelo gera um único token (1 ou 2, restrito por
+    esquema) e `confidence` é a probabilidade dele entre os dois, lida das
+    log-probabilidades; nos outros modos é None.
+    `client` atende a requisição (módulo `ollama` por padrão, ou um OllamaPool).
+    """
+    if pun_position is None:
+        pun_position = pair_order(pair_id, order_seed)
+    phrases_list = [gold_pun, gold_non] if pun_position == 1 else [gold_non, gold_pun]
+    
+    final_prompt = f"{prompt_instruction}\n\nFrases:\n1. {phrases_list[0]}\n2. {phrases_list[1]}"
+
+    ollama_options = {
+            "temperature": 0,
+            "seed": 42
+        }
+    
+    system_prompt = ''''
+    Siga estritamente este formato de resposta, sem adicionar texto extra:
+    (Texto da frase, Classificação)
+    (Texto da frase, Classificação)
+    '''
+
+    request = dict(
+        model=model,
+        system=system_prompt,
+        prompt=final_prompt,
+        options=ollama_options,
+        stream=False
+    )
+    if structured:
+        request.update(
+            system=STRUCTURED_SYSTEM_PROMPT,
+            options={**ollama_options, "num_predict": max_tokens},
+            format=PAIR_SCHEMA
+        )
+    if score:
+        request.update(
+            system=SCORE_SYSTEM_PROMPT,
+            options={**ollama_options, "num_predict": SCORE_MAX_TOKENS},
+            format=PAIR_SCORE_SCHEMA,
+            logprobs=True,
+            top_logprobs=SCORE_TOP_LOGPROBS
+        )
+    client = client or ollama
+    started_at = time.monotonic()
+    if stream_abort and not score:
+        response = stream_generate(json_decided if structured else tuples_decided(2), cache, client.generate, **request)
+    else:
+        response = cache.generate(client.generate, **request) if cache else client.generate(**request)
+    telemetry = response_telemetry(response, time.monotonic() - started_at)
+    
+    raw_response = response['response'].strip()
+    pred_pun, is_correct, error_flag = judge_pair(raw_response, gold_pun, phrases_list, structured, score)
+    confidence = None
+    if score and not error_flag:
+        confidence = score_confidence(raw_response, response.get('logprobs'), SCORE_CHOICES)
+    
+    return (pair_id, gold_pun, gold_non, raw_response, pred_pun, is_correct, error_flag, pun_position,
+            order_seed, confidence), telemetry
+
+def judge_pair(raw_response, gold_pun, phrases_list=None, structured=False, scored=False):
+    """
+    (predicted_pun_phrase, is_correct, error_flag) a partir da resposta crua.
+    Nos modos estruturado e de pontuação a resposta é só o índice, então é
+    preciso a ordem em que as frases foram mostradas (`phrases_list`).
+    """
+    if scored:
+        try:
+            pred_pun = phrases_list[int(parse_score_choice(raw_response, SCORE_CHOICES)) - 1]
+        except ValueError:
+            pred_pun = None
+    elif structured:
+        try:
+            pred_pun = phrases_list[parse_json_pair(raw_response) - 1]
+        except ValueError:
+            pred_pun = None
+    else:
+        pred_pun, pred_non = parse_llm_response(raw_response)
+    
+    is_correct = 0
+    error_flag = 0
+    
+    if pred_pun:
+        if texts_match(pred_pun, gold_pun):
+            is_correct = 1
+    else:
+        error_flag = 1
+
+    return pred_pun, is_correct, error_flag
+
+def pair_result_row(row, telemetry, queue_wait_ms=None):
+    """Linha completa de PAIR_COLUMNS: a linha do par seguida da telemetria."""
+    return (*row, *telemetry_values(telemetry, queue_wait_ms))
+
+def load_pairs_to_process(csv_path, db_path, both_orders=False):
+    """
+    Monta os pares (pair_id, frase .H, frase .N) do CSV que ainda não estão
+    em results_pairs (com `both_orders`, nas duas ordens), a partir do
+    índice de pares (ver utils/pair_index.py).
+    Devolve (total de pares completos, pares a processar).
+    Erros de leitura do CSV são propagados.
+    """
+    index = load_pair_index(csv_path)
+    if not index.is_clean():
+        print(f"Aviso: {index.report()}; apenas os pares completos serão classificados.")
+
+    setup_database(db_path)
+    processed_ids = get_processed_ids(db_path, both_orders)
+
+    pending = index.pairs[~index.pairs.index.isin(list(processed_ids))]
+    pairs_to_process = list(zip(pending.index, pending['pun'], pending['non']))
+
+    return len(index.pairs), pairs_to_process
+
+def derive_from_phrases(pairs_to_process, phrases_db, writer):
+    """
+    Grava em results_pairs os pares cujas duas frases já estão classificadas
+    no banco de frases `phrases_db` (ver derive_pair_verdicts) e devolve os
+    pares que ainda precisam ir ao LLM.
+    """
+    pairs = pd.DataFrame(pairs_to_process, columns=['base_id', 'pun', 'non']).set_index('base_id')
+    verdicts, pending_ids = derive_pair_verdicts(pairs, phrases_db)
+
+    for pair_id, verdict in verdicts.iterrows():
+        confidence = None if pd.isna(verdict['confidence']) else float(verdict['confidence'])
+        writer.write((
+            pair_id, pairs.at[pair_id, 'pun'], pairs.at[pair_id, 'non'],
+            derived_response(verdict['pun_label'], verdict['non_label']),
+            verdict['predicted_pun_phrase'], int(verdict['is_correct']), int(verdict['error_flag']),
+            None, None, confidence, *telemetry_values(None)
+        ))
+
+    print(f"Pares derivados do banco de frases: {len(verdicts)} ({int(verdicts['error_flag'].sum())} empatados)")
+    pending = set(pending_ids)
+    return [pair for pair in pairs_to_process if pair[0] in pending]
+
+def read_prompt(prompt_template_path):
+    with open(prompt_template_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def process_pairs_csv(csv_path, prompt_template_path, db_path, commit_every=50, commit_interval=5.0,
+                      cache_path=DEFAULT_CACHE_PATH, cache_max_mb=DEFAULT_MAX_MB, structured=False,
+                      max_tokens=STRUCTURED_MAX_TOKENS, stream_abort=False, model=MODEL_NAME, ollama_hosts=None,
+                      max_attempts=DEFAULT_MAX_ATTEMPTS, order_seed=DEFAULT_ORDER_SEED, both_orders=False, score=False,
+                      phrases_db=None):
     try:
-        df = pd.read_csv(csv_path)
+        total_pairs, pairs_to_process = load_pairs_to_process(csv_path, db_path, both_orders)
     except Exception as e:
         print(f"ERRO ao ler CSV: {e}")
         return
 
-    pairs_dict = {}
-    for _, row in df.iterrows():
-        full_id = str(row.get('id', ''))
-        text = str(row.get('text', ''))
-        
-        if '.' in full_id:
-            base_id, suffix = full_id.rsplit('.', 1)
-            if base_id not in pairs_dict:
-                pairs_dict[base_id] = {}
-            
-            if suffix == 'H':
-                pairs_dict[base_id]['pun'] = text
-            elif suffix == 'N':
-                pairs_dict[base_id]['non'] = text
-
-    setup_database(db_path)
-    processed_ids = get_processed_ids(db_path)
-    
-    pairs_to_process = []
-    for pid, data in pairs_dict.items():
-        if 'pun' in data and 'non' in data:
-            if pid not in processed_ids:
-                pairs_to_process.append((pid, data['pun'], data['non']))
-    
-    print(f"Total de pares encontrados: {len(pairs_dict)}")
+    print(f"Total de pares encontrados: {total_pairs}")
     print(f"Pares a processar: {len(pairs_to_process)}")
     
     if not pairs_to_process:
         return
 
     try:
-        with open(prompt_template_path, 'r', encoding='utf-8') as f:
-            prompt_instruction = f.read()
+        prompt_instruction = read_prompt(prompt_template_path)
     except:
         print("Erro ao ler arquivo de prompt.")
         return
@@ -125,75 +305,90 @@ def process_pairs_csv(csv_path, prompt_template_path, db_path):
     Não explique. Apenas as tuplas.
     """
 
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    # Commits agrupados; o lote pendente também é gravado no atexit (ex.: Ctrl-C)
+    writer = ResultWriter(
+        db_path, "results_pairs",
+        PAIR_COLUMNS,
+        batch_size=commit_every, flush_interval=commit_interval
+    )
+    if phrases_db and both_orders:
+        print("AVISO: --from-phrases é ignorado com --both-orders (os pares derivados não têm ordem).")
+    elif phrases_db:
+        try:
+            pairs_to_process = derive_from_phrases(pairs_to_process, phrases_db, writer)
+        except (sqlite3.Error, ValueError) as e:
+            print(f"ERRO ao ler o banco de frases: {e}")
+            writer.close()
+            return
+        print(f"Pares a enviar ao LLM: {len(pairs_to_process)}")
 
-    for pair_id, gold_pun, gold_non in tqdm(pairs_to_process):
-        
-        phrases_list = [gold_pun, gold_non]
-        random.shuffle(phrases_list)
-        
-        final_prompt = f"{prompt_instruction}\n\nFrases:\n1. {phrases_list[0]}\n2. {phrases_list[1]}"
+    cache = open_cache(cache_path, cache_max_mb)
+    pool = open_pool(ollama_hosts)
+    # Erros passageiros são repetidos; pares que continuam falhando vão para dead_letter
+    policy = RetryPolicy(max_attempts)
+    dead_letters = dead_letter_writer(db_path)
 
-        ollama_options = {
-                "temperature": 0,
-                "seed": 42
-            }
-        
-        system_prompt = ''''
-        Siga estritamente este formato de resposta, sem adicionar texto extra:
-        (Texto da frase, Classificação)
-        (Texto da frase, Classificação)
-        '''
+    # No modo --both-orders, as duas ordens de cada par vão em paralelo; posições já gravadas são puladas
+    done_positions = get_processed_positions(db_path) if both_orders else {}
+    executor = ThreadPoolExecutor(max_workers=2) if both_orders else None
+
+    def classify(pair_id, gold_pun, gold_non, pun_position=None):
+        return policy.call(classify_pair, pair_id, gold_pun, gold_non, prompt_instruction, cache, structured,
+                           max_tokens, stream_abort, model, pool, order_seed, pun_position, score)
 
+    for pair_id, gold_pun, gold_non in tqdm(pairs_to_process):
         try:
-            response = ollama.generate(
-                model="llama3",
-                system=system_prompt,
-                prompt=final_prompt,
-                options=ollama_options,
-                stream=False
-            )
-            
-            raw_response = response['response'].strip()
-            
-            pred_pun, pred_non = parse_llm_response(raw_response)
-            
-            is_correct = 0
-            error_flag = 0
-            
-            if pred_pun:
-                def normalize_text(t):
-                    return t.lower().strip().strip("'").strip('"').strip('.').strip()
-
-                p_clean = normalize_text(pred_pun)
-                g_clean = normalize_text(gold_pun)
-                
-                if p_clean == g_clean or (len(p_clean) > 4 and p_clean in g_clean):
-                    is_correct = 1
-                else:
-
-                    pass
+            if executor:
+                positions = [p for p in (1, 2) if p not in done_positions.get(pair_id, ())]
+                futures = [executor.submit(classify, pair_id, gold_pun, gold_non, p) for p in positions]
+                # Grava só quando todas as ordens pendentes do par terminaram
+                results = [future.result() for future in futures]
             else:
-                error_flag = 1
-            
-            cursor.execute("""
-                INSERT INTO results_pairs 
-                (pair_id, pun_phrase_gold, non_pun_phrase_gold, model_response_raw, predicted_pun_phrase, is_correct, error_flag)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (pair_id, gold_pun, gold_non, raw_response, pred_pun, is_correct, error_flag))
-            
-            conn.commit()
+                results = [classify(pair_id, gold_pun, gold_non)]
+            for row, telemetry in results:
+                writer.write(pair_result_row(row, telemetry))
 
         except Exception as e:
-            print(f"Erro no par {pair_id}: {e}")
+            print(f"Erro no par {pair_id}, enviado para dead_letter: {e}")
+            dead_letters.write(dead_letter_row(pair_id, {"pun": gold_pun, "non": gold_non}, e))
             continue
 
-    conn.close()
+    if executor:
+        executor.shutdown()
+    writer.close()
+    dead_letters.close()
+    policy.report()
+    pool.report()
+    if cache:
+        cache.report()
+        cache.close()
     print("Processamento finalizado.")
 
 if __name__ == "__main__":
-    if len(sys.argv) != 4:
-        print("Uso: python classificate_pairs.py <dataset.csv> <prompt.txt> <output.db>")
-    else:
-        process_pairs_csv(sys.argv[1], sys.argv[2], sys.argv[3])
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Classifica pares de frases (Trocadilho / Não trocadilho) com o Llama 3.")
+
+    parser.add_argument("csv_file", help="Caminho para o CSV de pares (ids terminados em .H / .N)")
+    parser.add_argument("prompt_file", help="Caminho para o arquivo de prompt")
+    parser.add_argument("db_file", help="Caminho para o banco SQLite de resultados")
+    parser.add_argument("--model", default=MODEL_NAME, help=f"Modelo do Ollama (padrão: {MODEL_NAME})")
+    parser.add_argument("--ollama-host", action="append", help="Endpoint do Ollama (repetível ou separado por vírgulas); as requisições vão para o menos carregado (padrão: OLLAMA_HOST)")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS, help=f"Tentativas por par antes de mandá-lo para dead_letter (padrão: {DEFAULT_MAX_ATTEMPTS})")
+    parser.add_argument("--commit-every", type=int, default=50, help="Linhas por transação no SQLite (padrão: 50)")
+    parser.add_argument("--commit-interval", type=float, default=5.0, help="Segundos máximos entre commits (padrão: 5)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help=f"Banco do cache de respostas (padrão: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--no-cache", action="store_true", help="Não consulta nem grava o cache de respostas")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_MAX_MB, help=f"Tamanho máximo do cache em MB (padrão: {DEFAULT_MAX_MB})")
+    parser.add_argument("--structured", action="store_true", help="Pede a resposta em JSON restrito por esquema em vez de tuplas livres")
+    parser.add_argument("--stream-abort", action="store_true", help="Recebe a resposta em stream e cancela a geração assim que as tuplas estiverem completas")
+    parser.add_argument("--max-tokens", type=int, default=STRUCTURED_MAX_TOKENS, help=f"Limite de tokens gerados no modo --structured (padrão: {STRUCTURED_MAX_TOKENS})")
+    parser.add_argument("--order-seed", type=int, default=DEFAULT_ORDER_SEED, help=f"Seed da ordem das frases em cada par (padrão: {DEFAULT_ORDER_SEED})")
+    parser.add_argument("--both-orders", action="store_true", help="Classifica cada par nas duas ordens, em paralelo, para medir o viés de posição")
+    parser.add_argument("--score", action="store_true", help="Modo de pontuação: o modelo gera só o número da frase e a confiança é gravada em 'confidence'")
+    parser.add_argument("--from-phrases", metavar="PHRASES_DB", help="Banco do classificate_phrases.py: pares com as duas frases já classificadas são derivados dele, sem inferência")
+
+    args = parser.parse_args()
+
+    process_pairs_csv(args.csv_file, args.prompt_file, args.db_file, args.commit_every, args.commit_interval,
+                      None if args.no_cache else args.cache, args.cache_max_mb, args.structured, args.max_tokens,
+                      args.stream_abort, args.model, args.ollama_host, args.max_attempts, args.order_seed,
+                      args.both_orders, args.score, args.from_phrases)
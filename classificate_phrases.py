@@ -1,10 +1,55 @@
-import sys
+import argparse
 import ollama
 import pandas as pd
-import sqlite3
 import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
 from tqdm import tqdm
 
+from concurrency_control import AdaptiveConcurrency
+from llm_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_MB, open_cache
+from ollama_pool import open_pool
+from response_parsing import (LABEL_SCHEMA, SCORE_LABELS, SCORE_SCHEMA, batch_label_schema, json_decided,
+                              parse_json_label, parse_json_labels, parse_score_choice, parse_single_tuple, parse_tuples,
+                              score_confidence, single_tuple_decided, texts_match, tuples_decided)
+from result_writer import ResultWriter
+from retry_policy import DEFAULT_MAX_ATTEMPTS, RetryPolicy, dead_letter_row, dead_letter_writer
+from streaming import stream_generate
+from telemetry import TELEMETRY_COLUMNS, ensure_telemetry_columns, response_telemetry, submit_timed, telemetry_values
+from text_keys import chunked, text_hash
+from work_queue import DEFAULT_LEASE_SECONDS, WorkQueue
+
+MODEL_NAME = "llama3"
+
+SYSTEM_PROMPT = "Responda APENAS com a tupla solicitada. Não inclua nenhum outro texto."
+BATCH_SYSTEM_PROMPT = "Responda APENAS com as tuplas solicitadas, uma por linha. Não inclua nenhum outro texto."
+STRUCTURED_SYSTEM_PROMPT = 'Responda APENAS com o JSON {"rotulo": "Trocadilho"} ou {"rotulo": "Não trocadilho"}.'
+BATCH_STRUCTURED_SYSTEM_PROMPT = 'Responda APENAS com o JSON {"rotulos": [...]}, com um rótulo ("Trocadilho" ou "Não trocadilho") por frase.'
+SCORE_SYSTEM_PROMPT = "Responda APENAS com 1 se a frase for um trocadilho ou 0 se não for."
+
+# Tokens gerados por frase no modo estruturado; {"rotulo": "Não trocadilho"} cabe com folga
+STRUCTURED_MAX_TOKENS = 24
+
+# Modo de pontuação: um único token gerado, com as log-probabilidades dos mais prováveis
+SCORE_MAX_TOKENS = 1
+SCORE_TOP_LOGPROBS = 5
+
+RESULT_COLUMNS = [
+    "original_text", "correct_label", "model_input_prompt", "model_response_raw",
+    "extracted_text", "extracted_label", "text_hash", "confidence"
+] + TELEMETRY_COLUMNS
+
+# Linhas do CSV lidas por vez na retomada (ver iter_new_rows)
+CSV_CHUNKSIZE = 10000
+
+OLLAMA_OPTIONS = {
+    "temperature": 0,
+    "seed": 42
+}
+
 def setup_database(db_path):
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
@@ -17,28 +62,428 @@ def setup_database(db_path):
         model_input_prompt TEXT,
         model_response_raw TEXT,
         extracted_text TEXT,
-        extracted_label TEXT
+        extracted_label TEXT,
+        text_hash INTEGER,
+        confidence REAL -- probabilidade do rótulo no modo de pontuação
     )
     """)
 
+    add_text_hash_column(conn)
+    if 'confidence' not in {row[1] for row in cursor.execute("PRAGMA table_info(results)")}:
+        cursor.execute("ALTER TABLE results ADD COLUMN confidence REAL")
+    ensure_telemetry_columns(conn, "results")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_original_text ON results (original_text)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_text_hash ON results (text_hash)")
     conn.commit()
     conn.close()
 
-def process_csv(csv_path, prompt_template_path, db_path):
+def add_text_hash_column(conn, block_size=10000):
+    """
+    Migra bancos criados antes da coluna text_hash: adiciona a coluna e a
+    preenche em blocos de `block_size` linhas, sem carregar a tabela inteira.
+    """
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(results)")}
+    if 'text_hash' in columns:
+        return
+
+    conn.execute("ALTER TABLE results ADD COLUMN text_hash INTEGER")
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, original_text FROM results WHERE id > ? ORDER BY id LIMIT ?", (last_id, block_size)
+        ).fetchall()
+        if not rows:
+            break
+        conn.executemany("UPDATE results SET text_hash = ? WHERE id = ?", [(text_hash(text), id_) for id_, text in rows])
+        last_id = rows[-1][0]
+    conn.commit()
+
+def iter_new_rows(csv_path, db_path, chunksize=CSV_CHUNKSIZE):
+    """
+    Lê o CSV em blocos de `chunksize` linhas e gera (texto, label, text_hash)
+    das linhas ainda não processadas. A checagem é feita por text_hash no
+    índice do banco, bloco a bloco. Textos repetidos no CSV são gerados uma
+    única vez (original_text é UNIQUE): os hashes já gerados ficam numa
+    tabela temporária do SQLite, não em memória, então a memória depende do
+    tamanho do bloco e não do tamanho do corpus.
+    """
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TEMP TABLE dispatched (text_hash INTEGER PRIMARY KEY)")
+    try:
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+            texts = chunk['text'].astype(str).tolist()
+            labels = chunk['label'].astype(str).tolist() if 'label' in chunk.columns else ['N/A'] * len(texts)
+            hashes = [text_hash(text) for text in texts]
+
+            fresh = set(hashes)
+            for block in chunked(sorted(fresh), 500):
+                placeholders = ", ".join("?" for _ in block)
+                fresh.difference_update(
+                    row[0] for row in conn.execute(f"SELECT text_hash FROM results WHERE text_hash IN ({placeholders})", block)
+                )
+                fresh.difference_update(
+                    row[0] for row in conn.execute(f"SELECT text_hash FROM temp.dispatched WHERE text_hash IN ({placeholders})", block)
+                )
+            conn.executemany("INSERT INTO temp.dispatched (text_hash) VALUES (?)", ((hash_,) for hash_ in fresh))
+            # Sem transação aberta entre blocos, para não segurar o checkpoint do WAL
+            conn.commit()
+
+            for text, label, hash_ in zip(texts, labels, hashes):
+                if hash_ not in fresh:
+                    continue
+                fresh.discard(hash_)
+                yield text, label, hash_
+    finally:
+        conn.close()
+
+class PrefixReuseStats:
+    """
+    Acumula o prompt_eval das requisições no modo de reuso de prefixo para
+    comparar com o custo de avaliar o template completo a cada linha.
+    """
+
+    def __init__(self):
+        self.template_eval_count = 0
+        self.template_eval_ns = 0
+        self.rows = 0
+        self.row_eval_count = 0
+        self.row_eval_ns = 0
+        self._lock = threading.Lock()
+
+    def prime(self, prompt_template, system_prompt=SYSTEM_PROMPT, model=MODEL_NAME, client=ollama):
+        """
+        Avalia o system + template uma única vez (sem gerar texto útil), o que
+        deixa o prefixo no cache KV do Ollama e mede quanto ele custa.
+        Com vários endpoints, só o que receber esta chamada fica com o prefixo
+        em cache; os demais o avaliam na primeira frase que receberem.
+        """
+        response = client.chat(
+            model=model,
+            messages=[pinned_system_message(prompt_template, system_prompt)],
+            options={**OLLAMA_OPTIONS, "num_predict": 1},
+            stream=False
+        )
+        self.template_eval_count = response.get('prompt_eval_count') or 0
+        self.template_eval_ns = response.get('prompt_eval_duration') or 0
+
+    def add(self, response):
+        with self._lock:
+            self.rows += 1
+            self.row_eval_count += response.get('prompt_eval_count') or 0
+            self.row_eval_ns += response.get('prompt_eval_duration') or 0
+
+    def report(self):
+        if not self.rows:
+            return
+        mean_tokens = self.row_eval_count / self.rows
+        mean_ms = self.row_eval_ns / self.rows / 1e6
+        template_ms = self.template_eval_ns / 1e6
+        # Sem reuso, cada linha pagaria template + frase; com reuso pagou o medido
+        # em row_eval_ns mais a avaliação única do template. Ignorar o custo da
+        # frase no cenário sem reuso torna o valor um limite inferior.
+        saved_ms = max(0.0, template_ms * self.rows - self.row_eval_ns / 1e6 - template_ms)
+        print(f"Reuso de prefixo: template avaliado uma vez ({self.template_eval_count} tokens, {template_ms:.1f} ms).")
+        print(f"  prompt_eval por linha: média de {mean_tokens:.1f} tokens, {mean_ms:.1f} ms em {self.rows} linhas.")
+        print(f"  Economia de prompt_eval medida (limite inferior): {saved_ms / 1000:.1f} s.")
+
+def pinned_system_message(prompt_template, system_prompt=SYSTEM_PROMPT):
+    """Mensagem de sistema fixa (instrução + template) usada no modo de reuso de prefixo."""
+    return {"role": "system", "content": f"{system_prompt}\n\n{prompt_template}"}
+
+BATCH_HEADER = "Classifique CADA uma das {size} frases numeradas abaixo, de forma independente. "
+
+def build_batch_text(texts, structured=False):
+    numbered = "\n".join(f"{i}. {text}" for i, text in enumerate(texts, start=1))
+    if structured:
+        answer_format = f"Responda com a lista de {len(texts)} rótulos, na mesma ordem das frases."
+    else:
+        answer_format = (f"Responda com exatamente {len(texts)} tuplas, uma por linha e na mesma ordem, "
+                         f"no formato (frase original, rótulo classificado).")
+    return f"{BATCH_HEADER.format(size=len(texts))}{answer_format}\n{numbered}"
+
+def batch_texts_from_prompt(final_prompt):
+    """
+    Inverso de build_batch_text: as frases de uma requisição em lote, a partir
+    do model_input_prompt gravado. Devolve None se o prompt não for de lote.
+    """
+    match = re.search(BATCH_HEADER.format(size=r"(\d+)").replace(".", r"\."), final_prompt)
+    if not match:
+        return None
+    size = int(match.group(1))
+    lines = final_prompt[match.end():].split("\n")[1:1 + size]
+    return [re.sub(r"^\d+\. ", "", line, count=1) for line in lines]
+
+def parse_phrase_answer(original_text, model_response_raw, structured=False, scored=False):
+    """
+    (extracted_text, extracted_label) da resposta de uma frase. Lança
+    ValueError/TypeError se a resposta não tiver um rótulo legível.
+    """
+    if scored:
+        return original_text, SCORE_LABELS[parse_score_choice(model_response_raw, SCORE_LABELS)]
+    if structured:
+        # O texto não é repetido pelo modelo no modo estruturado
+        return original_text, parse_json_label(model_response_raw)
+    return parse_single_tuple(model_response_raw)
+
+def parse_batch_answers(texts, model_response_raw, structured=False):
+    """Respostas de um lote alinhadas com `texts`, com None nas frases sem rótulo válido."""
+    if structured:
+        try:
+            labels = parse_json_labels(model_response_raw)
+        except ValueError:
+            labels = []
+        answers = [(text, label) if label else None for text, label in zip(texts, labels)]
+        return answers + [None] * (len(texts) - len(answers))
+    return match_batch_answers(texts, parse_tuples(model_response_raw))
+
+def match_batch_answers(texts, tuples):
+    """
+    Associa cada tupla (texto, rótulo) da resposta a uma das frases enviadas.
+    Primeiro pelo texto repetido pelo modelo; se o modelo devolveu exatamente
+    uma tupla por frase, as que sobrarem são casadas pela posição.
+    Tuplas sem rótulo reconhecível são descartadas. Devolve uma lista
+    alinhada com `texts`, com None nas frases sem resposta válida.
+    """
+    answers = [None] * len(texts)
+    leftovers = []
+
+    for position, (text, label) in enumerate(tuples):
+        if 'trocadilho' not in label.lower():
+            continue
+        index = next(
+            (i for i, gold in enumerate(texts) if answers[i] is None and texts_match(text, gold)),
+            None
+        )
+        if index is None:
+            leftovers.append((position, text, label))
+        else:
+            answers[index] = (text, label)
+
+    if len(tuples) == len(texts):
+        for position, text, label in leftovers:
+            if answers[position] is None:
+                answers[position] = (text, label)
+
+    return answers
+
+class PhraseClassifier:
+    """
+    Envia frases ao Llama 3 com um template fixo e extrai os rótulos.
+
+    Os resultados seguem o formato
+    (final_prompt, model_response_raw, extracted_text, extracted_label, confiança, telemetria);
+    erros de parse viram PARSE_ERROR e erros de conexão/API são propagados.
+
+    - `cache`: requisições já respondidas não vão ao Ollama.
+    - `prefix_stats`: modo de reuso de prefixo; o template vai numa mensagem
+      de sistema fixa e só a frase muda entre as requisições, então o Ollama
+      reaproveita o prefixo já avaliado em vez de reprocessar o template.
+    - `structured`: a resposta é um JSON restrito por esquema (parâmetro
+      `format`) com no máximo `max_tokens` tokens gerados por frase, lido com
+      um único json.loads em vez de regex.
+    - `stream_abort`: a resposta chega em stream e a geração é cancelada
+      assim que a tupla (ou o JSON) com o rótulo estiver completa; o texto
+      parcial é o que fica em model_response_raw.
+    - `client`: quem atende as requisições (`generate`/`chat`); o módulo
+      `ollama` por padrão, ou um OllamaPool com vários endpoints.
+    - `score`: modo de pontuação; o modelo gera um único dígito (1 ou 0,
+      restrito por esquema) e a confiança é a probabilidade desse dígito
+      entre os dois, lida das log-probabilidades. Nos outros modos a
+      confiança é None.
+    """
+
+    def __init__(self, prompt_template, cache=None, prefix_stats=None, structured=False,
+                 max_tokens=STRUCTURED_MAX_TOKENS, stream_abort=False, model=MODEL_NAME, client=None, score=False):
+        self.prompt_template = prompt_template
+        self.model = model
+        self.client = client or ollama
+        self.cache = cache
+        self.prefix_stats = prefix_stats
+        self.structured = structured
+        self.max_tokens = max_tokens
+        self.stream_abort = stream_abort
+        self.score = score
+        self.early_stops = 0
+        self._lock = threading.Lock()
+
+    def system_prompt(self, batch=False):
+        if self.score:
+            return SCORE_SYSTEM_PROMPT
+        if self.structured:
+            return BATCH_STRUCTURED_SYSTEM_PROMPT if batch else STRUCTURED_SYSTEM_PROMPT
+        return BATCH_SYSTEM_PROMPT if batch else SYSTEM_PROMPT
+
+    def request_completion(self, user_text, system_prompt, format=None, num_predict=None, decided=None):
+        """
+        Envia `user_text` depois do template e devolve
+        (final_prompt, resposta crua, telemetria da requisição).
+        No modo `stream_abort`, `decided` é o critério que encerra a geração
+        assim que o rótulo pode ser lido do texto parcial.
+        """
+        final_prompt, response, telemetry = self.send(user_text, system_prompt, format, num_predict, decided)
+        return final_prompt, self.response_text(response), telemetry
+
+    def response_text(self, response):
+        if self.prefix_stats:
+            return response['message']['content'].strip()
+        return response['response'].strip()
+
+    def send(self, user_text, system_prompt, format=None, num_predict=None, decided=None, top_logprobs=None):
+        """
+        Como request_completion, mas devolve a resposta inteira do Ollama.
+        Com `top_logprobs`, pede também as log-probabilidades de cada token.
+        """
+        final_prompt = f"{self.prompt_template}\n{user_text}"
+        options = OLLAMA_OPTIONS if num_predict is None else {**OLLAMA_OPTIONS, "num_predict": num_predict}
+
+        if self.prefix_stats:
+            generate_fn = self.client.chat
+            request = dict(
+                model=self.model,
+                messages=[pinned_system_message(self.prompt_template, system_prompt), {"role": "user", "content": user_text}],
+                options=options,
+                format=format,
+                stream=False
+            )
+        else:
+            generate_fn = self.client.generate
+            request = dict(
+                model=self.model,
+                system=system_prompt,
+                prompt=final_prompt,
+                options=options,
+                format=format,
+                stream=False
+            )
+
+        if top_logprobs:
+            request.update(logprobs=True, top_logprobs=top_logprobs)
+
+        started_at = time.monotonic()
+        if self.stream_abort and decided:
+            response = stream_generate(decided, self.cache, generate_fn, **request)
+            if response.get('early_stop'):
+                with self._lock:
+                    self.early_stops += 1
+        elif self.cache:
+            response = self.cache.generate(generate_fn, **request)
+        else:
+            response = generate_fn(**request)
+        telemetry = response_telemetry(response, time.monotonic() - started_at)
+
+        if self.prefix_stats:
+            self.prefix_stats.add(response)
+        return final_prompt, response, telemetry
+
+    def classify_phrase(self, original_text):
+        final_prompt = f"{self.prompt_template}\n{original_text}"
+        telemetry = None
+        model_response_raw = ""
+        extracted_text = "PARSE_ERROR"
+        extracted_label = "PARSE_ERROR"
+        confidence = None
+
+        try:
+            if self.score:
+                final_prompt, response, telemetry = self.send(
+                    original_text, self.system_prompt(), SCORE_SCHEMA, SCORE_MAX_TOKENS, top_logprobs=SCORE_TOP_LOGPROBS
+                )
+                model_response_raw = self.response_text(response)
+                extracted_text, extracted_label = parse_phrase_answer(original_text, model_response_raw, scored=True)
+                confidence = score_confidence(model_response_raw, response.get('logprobs'), SCORE_LABELS)
+                return final_prompt, model_response_raw, extracted_text, extracted_label, confidence, telemetry
+            if self.structured:
+                final_prompt, model_response_raw, telemetry = self.request_completion(
+                    original_text, self.system_prompt(), LABEL_SCHEMA, self.max_tokens, json_decided
+                )
+            else:
+                final_prompt, model_response_raw, telemetry = self.request_completion(
+                    original_text, self.system_prompt(), decided=single_tuple_decided
+                )
+            extracted_text, extracted_label = parse_phrase_answer(original_text, model_response_raw, self.structured)
+
+        except (SyntaxError, ValueError, TypeError) as e:
+            print(f"\nAVISO: Erro ao processar a resposta: '{model_response_raw}'. Erro: {e}")
+
+        return final_prompt, model_response_raw, extracted_text, extracted_label, confidence, telemetry
+
+    def classify_batch(self, texts):
+        """
+        Classifica várias frases numa única requisição. Devolve uma lista de
+        resultados alinhada com `texts`. Frases que o modelo omitiu ou devolveu
+        malformadas são reenviadas individualmente.
+        """
+        if len(texts) == 1 or self.score:
+            # O modo de pontuação lê um único token por requisição
+            return [self.classify_phrase(text) for text in texts]
+
+        batch_text = build_batch_text(texts, self.structured)
+        if self.structured:
+            final_prompt, model_response_raw, telemetry = self.request_completion(
+                batch_text, self.system_prompt(batch=True),
+                batch_label_schema(len(texts)), self.max_tokens * len(texts), json_decided
+            )
+        else:
+            final_prompt, model_response_raw, telemetry = self.request_completion(
+                batch_text, self.system_prompt(batch=True), decided=tuples_decided(len(texts))
+            )
+        answers = parse_batch_answers(texts, model_response_raw, self.structured)
+
+        # A telemetria do lote é dividida só entre as frases que ele respondeu;
+        # as reenviadas ficam com a da própria requisição (rows_in_request = 1)
+        telemetry["rows_in_request"] = sum(answer is not None for answer in answers)
+
+        results = []
+        for text, answer in zip(texts, answers):
+            if answer is None:
+                result = self.classify_phrase(text)
+                if result[-1] is not None:
+                    result[-1]["rows_in_request"] = 1
+                results.append(result)
+            else:
+                extracted_text, extracted_label = answer
+                results.append((final_prompt, model_response_raw, extracted_text, extracted_label, None, telemetry))
+        return results
+
+def result_row(row, result, queue_wait_ms=None):
+    """Linha de RESULT_COLUMNS a partir de (texto, label, text_hash) e do resultado do classificador."""
+    original_text, correct_label, hash_ = row
+    final_prompt, model_response_raw, extracted_text, extracted_label, confidence, telemetry = result
+    return (original_text, correct_label, final_prompt, model_response_raw, extracted_text, extracted_label, hash_,
+            confidence, *telemetry_values(telemetry, queue_wait_ms))
+
+def process_csv(csv_path, prompt_template_path, db_path, concurrency=1, commit_every=50, commit_interval=5.0,
+                cache_path=DEFAULT_CACHE_PATH, cache_max_mb=DEFAULT_MAX_MB, prefix_reuse=False, batch_size=1,
+                structured=False, max_tokens=STRUCTURED_MAX_TOKENS, stream_abort=False, csv_chunksize=CSV_CHUNKSIZE,
+                model=MODEL_NAME, ollama_hosts=None, work_queue=False, lease_seconds=DEFAULT_LEASE_SECONDS,
+                adaptive=False, max_concurrency=16, concurrency_log=None, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                score=False):
     """
     Processa cada linha de um CSV com o Llama 3 e salva no SQLite.
     Agora, salva a cada linha e pula linhas já processadas.
+    Com concurrency > 1, mantém até N requisições simultâneas ao Ollama;
+    apenas a thread principal escreve no banco.
+    Os INSERTs são agrupados pelo ResultWriter (commit a cada `commit_every`
+    linhas ou `commit_interval` segundos).
+    Respostas são reaproveitadas do cache em `cache_path` (None desativa).
+    Com `prefix_reuse`, o template é avaliado uma vez e reaproveitado pelo
+    Ollama nas linhas seguintes (ver PhraseClassifier).
+    Com batch_size > 1, envia até K frases numeradas por requisição (ver PhraseClassifier.classify_batch).
+    Com `structured`, pede a resposta em JSON com no máximo `max_tokens` tokens por frase.
+    Com `stream_abort`, cancela cada geração assim que o rótulo estiver decidido.
+    O CSV é lido em blocos de `csv_chunksize` linhas e a retomada compara
+    text_hash no banco (ver iter_new_rows), sem carregar o corpus inteiro.
+    As requisições são distribuídas entre os `ollama_hosts` (ver OllamaPool).
+    Com `work_queue`, as linhas são reservadas por lease na tabela work_queue
+    (ver WorkQueue), e vários processos podem dividir o mesmo banco.
+    Com `adaptive`, `concurrency` é só o ponto de partida: o limite varia
+    entre 1 e `max_concurrency` conforme a latência e os erros observados
+    (ver AdaptiveConcurrency), com o histórico em `concurrency_log`.
+    Erros passageiros são repetidos até `max_attempts` vezes (ver RetryPolicy);
+    linhas que continuam falhando vão para a tabela dead_letter e o run segue.
+    Com `score`, cada frase é uma requisição de um único token e a confiança
+    do rótulo é gravada em `confidence` (ver PhraseClassifier).
     """
-    
-    try:
-        df = pd.read_csv(csv_path)
-    except FileNotFoundError:
-        print(f"ERRO: Arquivo CSV '{csv_path}' não encontrado.")
-        return
-    except Exception as e:
-        print(f"ERRO ao ler CSV: {e}")
-        return
 
     try:
         with open(prompt_template_path, 'r', encoding='utf-8') as f:
@@ -49,85 +494,167 @@ def process_csv(csv_path, prompt_template_path, db_path):
 
     setup_database(db_path)
     conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT original_text FROM results")
-    processed_texts = {row[0] for row in cursor.fetchall()}
-    print(f"Encontrados {len(processed_texts)} resultados já processados no banco de dados.")
+    processed_count = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+    conn.close()
+    print(f"Encontrados {processed_count} resultados já processados no banco de dados.")
 
-    df_to_process = df[~df['text'].isin(processed_texts)]
-    if len(df_to_process) == 0:
+    queue = WorkQueue(db_path, lease_seconds=lease_seconds) if work_queue else None
+
+    # Primeira passada só conta as linhas novas, para o total do tqdm
+    # (no modo fila, enfileira as que faltarem e conta o que ainda não tem resultado)
+    try:
+        if queue:
+            queue.enqueue(iter_new_rows(csv_path, db_path, csv_chunksize))
+            new_count = queue.remaining()
+        else:
+            new_count = sum(1 for _ in iter_new_rows(csv_path, db_path, csv_chunksize))
+    except FileNotFoundError:
+        print(f"ERRO: Arquivo CSV '{csv_path}' não encontrado.")
+        return
+    except Exception as e:
+        print(f"ERRO ao ler CSV: {e}")
+        return
+
+    if new_count == 0:
         print("Nenhuma linha nova para processar. Encerrando.")
-        conn.close()
         return
         
-    print(f"--- Processando {len(df_to_process)} NOVAS linhas de {len(df)} totais ---")
-    
-    ollama_options = {
-        "temperature": 0,
-        "seed": 42
-    }
-    
-    system_prompt = "Responda APENAS com a tupla solicitada. Não inclua nenhum outro texto."
-
-    for _, row in tqdm(df_to_process.iterrows(), total=df_to_process.shape[0]):
-        
-        original_text = str(row.get('text', 'N/A'))
-        correct_label = str(row.get('label', 'N/A'))
+    print(f"--- Processando {new_count} NOVAS linhas ---")
+    if score:
+        print("--- Modo de pontuação: um token por frase, com confiança do rótulo ---")
+        if batch_size > 1:
+            print("AVISO: --batch-size é ignorado no modo --score (uma frase por requisição).")
+            batch_size = 1
+    controller = AdaptiveConcurrency(concurrency, 1, max_concurrency, concurrency_log) if adaptive else None
+    if controller:
+        print(f"--- Concorrência adaptativa: começa em {controller.limit}, até {controller.max_limit} requisições simultâneas ---")
+    elif concurrency > 1:
+        print(f"--- Modo concorrente: até {concurrency} requisições simultâneas ---")
+    if batch_size > 1:
+        print(f"--- Modo em lote: até {batch_size} frases por requisição ---")
 
-        try:
-            final_prompt = f"{prompt_template}\n{original_text}"
-        except KeyError:
-            print(f"\nERRO: Seu prompt.txt NÃO contém a tag {{text}}. Verifique o arquivo.")
-            break
+    if queue:
+        print(f"--- Modo fila: worker {queue.worker_id}, leases de {lease_seconds:.0f} s ---")
+    else:
+        rows = iter_new_rows(csv_path, db_path, csv_chunksize)
+    progress = tqdm(total=new_count)
+    cache = open_cache(cache_path, cache_max_mb)
+    pool = open_pool(ollama_hosts)
 
-            
-        model_response_raw = ""
-        extracted_text = "PARSE_ERROR"
-        extracted_label = "PARSE_ERROR"
+    prefix_stats = PrefixReuseStats() if prefix_reuse else None
+    classifier = PhraseClassifier(prompt_template, cache, prefix_stats, structured, max_tokens, stream_abort, model,
+                                  pool, score)
+    if prefix_stats:
+        prefix_stats.prime(prompt_template, classifier.system_prompt(batch=batch_size > 1), model, pool)
 
-        try:
-            response = ollama.generate(
-                model="llama3",
-                system=system_prompt,
-                prompt=final_prompt,
-                options=ollama_options,
-                stream=False
-            )
-            
-            model_response_raw = response['response'].strip()
-            
-            match = re.search(r'\((["\'])(.*?)\1,\s*(.*?)\s*[\)"\']*\)$', model_response_raw)
-            
-            if match:
-                extracted_text = match.group(2)
-                extracted_label = match.group(3).strip().strip('\'"') 
-            else:
-                raise ValueError("Regex não conseguiu encontrar o padrão (texto, label)")
+    writer = ResultWriter(
+        db_path, "results",
+        RESULT_COLUMNS,
+        batch_size=commit_every, flush_interval=commit_interval, ignore_duplicates=True
+    )
 
-        except (SyntaxError, ValueError, TypeError) as e:
-            print(f"\nAVISO: Erro ao processar a resposta: '{model_response_raw}'. Erro: {e}")
-            
-        except Exception as e:
-            print(f"\nERRO Inesperado: {e}")
-            break # Sai do loop em caso de erro grave
-
-        cursor.execute(
-            "INSERT INTO results (original_text, correct_label, model_input_prompt, model_response_raw, extracted_text, extracted_label) VALUES (?, ?, ?, ?, ?, ?)",
-            (original_text, correct_label, final_prompt, model_response_raw, extracted_text, extracted_label)
-        )
-        
-        conn.commit()
-    conn.close()
+    policy = RetryPolicy(max_attempts)
+    dead_letters = dead_letter_writer(db_path)
+
+    workers = controller.max_limit if controller else concurrency
+    with writer, dead_letters, ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+
+        def collect(timeout=None):
+            """Grava o resultado das requisições que terminarem em até `timeout` segundos (None: a primeira)."""
+            if not pending:
+                time.sleep(timeout or 0)
+                return
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch, submitted_at = pending.pop(future)
+                try:
+                    queue_wait_ms, results = future.result()
+                except Exception as e:
+                    if controller:
+                        controller.record(time.monotonic() - submitted_at, error=True)
+                    print(f"\nERRO: {len(batch)} linha(s) enviadas para dead_letter: {e}")
+                    for original_text, correct_label, hash_ in batch:
+                        dead_letters.write(dead_letter_row(hash_, {"text": original_text, "label": correct_label}, e))
+                    progress.update(len(batch))
+                    continue
+
+                if controller:
+                    controller.record(time.monotonic() - submitted_at)
+                    progress.set_postfix(concorrencia=controller.limit, refresh=False)
+                for row, result in zip(batch, results):
+                    writer.write(result_row(row, result, queue_wait_ms))
+                progress.update(len(batch))
+
+        if queue:
+            # Enquanto espera leases de outros workers, a fila continua gravando as requisições deste
+            rows = queue.iter_claimed(concurrency * batch_size, idle=collect)
+
+        while True:
+            while len(pending) < (controller.limit if controller else concurrency):
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                texts = [original_text for original_text, _, _ in batch]
+                future = submit_timed(executor, policy.call, classifier.classify_batch, texts)
+                pending[future] = (batch, time.monotonic())
+
+            if not pending:
+                break
+
+            collect()
+
+    progress.close()
+    if controller:
+        controller.report()
+        controller.close()
+    if stream_abort:
+        print(f"Streaming: {classifier.early_stops} gerações interrompidas assim que o rótulo foi decidido.")
+    if prefix_stats:
+        prefix_stats.report()
+    policy.report()
+    pool.report()
+    if queue:
+        queue.report()
+        queue.close()
+    if cache:
+        cache.report()
+        cache.close()
     print(f"\n Processamento concluído. Resultados salvos em '{db_path}'.")
 
 if __name__ == "__main__":
-    if len(sys.argv) != 4:
-        print("Uso: python classificate_phrases.py <arquivo.csv> <prompt.txt> <banco.db>")
-        sys.exit(1)
-        
-    csv_file = sys.argv[1]
-    prompt_file = sys.argv[2]
-    db_file = sys.argv[3]
-    
-    process_csv(csv_file, prompt_file, db_file)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Classifica frases de um CSV com o Llama 3 e salva no SQLite.")
+
+    parser.add_argument("csv_file", help="Caminho para o CSV com as colunas 'text' e 'label'")
+    parser.add_argument("prompt_file", help="Caminho para o arquivo de prompt")
+    parser.add_argument("db_file", help="Caminho para o banco SQLite de resultados")
+    parser.add_argument("--concurrency", type=int, default=1, help="Número de requisições simultâneas ao Ollama (padrão: 1)")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS, help=f"Tentativas por requisição antes de mandar as linhas para dead_letter (padrão: {DEFAULT_MAX_ATTEMPTS})")
+    parser.add_argument("--adaptive", action="store_true", help="Ajusta o número de requisições simultâneas pela latência observada (AIMD), começando em --concurrency")
+    parser.add_argument("--max-concurrency", type=int, default=16, help="Limite superior do modo --adaptive (padrão: 16)")
+    parser.add_argument("--concurrency-log", help="CSV onde o modo --adaptive registra o limite escolhido ao longo do tempo")
+    parser.add_argument("--model", default=MODEL_NAME, help=f"Modelo do Ollama (padrão: {MODEL_NAME})")
+    parser.add_argument("--ollama-host", action="append", help="Endpoint do Ollama (repetível ou separado por vírgulas); as requisições vão para o menos carregado (padrão: OLLAMA_HOST)")
+    parser.add_argument("--csv-chunksize", type=int, default=CSV_CHUNKSIZE, help=f"Linhas do CSV lidas por vez (padrão: {CSV_CHUNKSIZE})")
+    parser.add_argument("--commit-every", type=int, default=50, help="Linhas por transação no SQLite (padrão: 50)")
+    parser.add_argument("--commit-interval", type=float, default=5.0, help="Segundos máximos entre commits (padrão: 5)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help=f"Banco do cache de respostas (padrão: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--no-cache", action="store_true", help="Não consulta nem grava o cache de respostas")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_MAX_MB, help=f"Tamanho máximo do cache em MB (padrão: {DEFAULT_MAX_MB})")
+    parser.add_argument("--work-queue", action="store_true", help="Reserva as linhas por lease no banco, para vários processos dividirem o mesmo run")
+    parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS, help=f"Validade da reserva de cada linha no modo --work-queue (padrão: {DEFAULT_LEASE_SECONDS:.0f})")
+    parser.add_argument("--prefix-reuse", action="store_true", help="Avalia o template uma vez e reaproveita o prefixo em cada frase")
+    parser.add_argument("--batch-size", type=int, default=1, help="Frases numeradas por requisição (padrão: 1)")
+    parser.add_argument("--structured", action="store_true", help="Pede a resposta em JSON restrito por esquema em vez de tupla livre")
+    parser.add_argument("--stream-abort", action="store_true", help="Recebe a resposta em stream e cancela a geração assim que o rótulo estiver decidido")
+    parser.add_argument("--max-tokens", type=int, default=STRUCTURED_MAX_TOKENS, help=f"Limite de tokens gerados por frase no modo --structured (padrão: {STRUCTURED_MAX_TOKENS})")
+    parser.add_argument("--score", action="store_true", help="Modo de pontuação: o modelo gera só 1 ou 0 e a confiança do rótulo é gravada em 'confidence'")
+
+    args = parser.parse_args()
+
+    process_csv(args.csv_file, args.prompt_file, args.db_file, max(1, args.concurrency),
+                args.commit_every, args.commit_interval,
+                None if args.no_cache else args.cache, args.cache_max_mb, args.prefix_reuse, max(1, args.batch_size),
+                args.structured, args.max_tokens, args.stream_abort, args.csv_chunksize,
+                args.model, args.ollama_host, args.work_queue, args.lease_seconds,
+                args.adaptive, max(1, args.max_concurrency), args.concurrency_log, args.max_attempts, args.score)
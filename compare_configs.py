@@ -0,0 +1,212 @@
+import sqlite3
+import pandas as pd
+import numpy as np
+import os
+import argparse
+from itertools import combinations
+
+from scipy.stats import binomtest, chi2
+
+from generateMetrics import label_case_sql, metrics_from_counts
+from text_keys import text_hash
+
+DEFAULT_RESAMPLES = 10000
+
+METRICS = [
+    ('f1_pos', 'F1 Score (Trocadilho)'),
+    ('f1_neg', 'F1 Score (Não Trocadilho)'),
+    ('accuracy', 'Accuracy'),
+    ('precision_pos', 'Precision (Trocadilho)'),
+    ('recall_pos', 'Recall (Trocadilho)'),
+    ('precision_neg', 'Precision (Não Trocadilho)'),
+    ('recall_neg', 'Recall (Não Trocadilho)'),
+]
+
+# Contribution of each item cell to (tn, fp, fn, tp).
+# Phrases: the cell is 2*y_true + y_pred, i.e. one confusion cell per row.
+# Pairs: the cell is is_correct, and a pair unfolds into one pun and one
+# non-pun instance, as in generateMetricsPairs.
+CELL_CONFUSION = {
+    'results': np.eye(4, dtype=np.int64),
+    'results_pairs': np.array([[0, 1, 1, 0], [1, 0, 0, 1]], dtype=np.int64),
+}
+
+
+def load_cells(db_path):
+    """
+    Reads one db as (table, Series of item cells indexed by the alignment key).
+    Single-phrase rows are keyed by text_hash (the hash of original_text) and
+    pairs by pair_id. Rows with an unrecognized gold or predicted label are
+    dropped; repeated keys (e.g. --both-orders runs) keep their first row.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table';")]
+        table = next((t for t in CELL_CONFUSION if t in tables), None)
+        if table is None:
+            raise ValueError(f"'{db_path}' has no results or results_pairs table.")
+
+        if table == 'results_pairs':
+            df = pd.read_sql_query("SELECT pair_id AS key, is_correct AS cell FROM results_pairs ORDER BY id", conn)
+        else:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(results)")}
+            key = 'text_hash' if 'text_hash' in columns else 'original_text'
+            # Labels are normalized by SQLite, so only integers are loaded
+            df = pd.read_sql_query(
+                f"SELECT {key} AS key, {label_case_sql('correct_label')} AS y_true, "
+                f"{label_case_sql('extracted_label')} AS y_pred FROM results ORDER BY id", conn
+            )
+            if key == 'original_text':
+                df['key'] = df['key'].map(text_hash)
+            df = df[(df['y_true'] != -1) & (df['y_pred'] != -1)]
+            df['cell'] = 2 * df['y_true'] + df['y_pred']
+    finally:
+        conn.close()
+
+    df = df.drop_duplicates('key')
+    return table, pd.Series(df['cell'].to_numpy(dtype=np.int64), index=pd.Index(df['key'].to_numpy()))
+
+
+def align(db_paths):
+    """
+    Loads every db and keeps the items present (with valid labels) in all of
+    them. Returns (table, config names, matrix of cells with one column per
+    config).
+    """
+    tables, series = set(), []
+    for path in db_paths:
+        table, cells = load_cells(path)
+        tables.add(table)
+        series.append(cells)
+        print(f"{path}: {len(cells)} valid rows in '{table}'")
+    if len(tables) > 1:
+        raise ValueError("Cannot compare single-phrase and pair databases with each other.")
+
+    names = [os.path.splitext(os.path.basename(path))[0] for path in db_paths]
+    aligned = pd.concat(series, axis=1, join='inner', keys=range(len(series)))
+    dropped = max(len(s) for s in series) - len(aligned)
+    if dropped:
+        print(f"Warning: {dropped} items are missing (or unlabeled) in at least one db and were left out.")
+    return tables.pop(), names, aligned.to_numpy()
+
+
+def confusion(cell_counts, table):
+    """(tn, fp, fn, tp) from counts per cell; works on a batch of resamples (rows)."""
+    counts = np.asarray(cell_counts) @ CELL_CONFUSION[table]
+    return counts[..., 0], counts[..., 1], counts[..., 2], counts[..., 3]
+
+
+def bootstrap_counts(cells, n_cells, resamples, rng):
+    """
+    Bootstrap resamples of the item cells as a (resamples x n_cells) count
+    matrix. Resampling n items with replacement is a multinomial draw over
+    the cell frequencies, so the cost does not depend on the number of rows.
+    """
+    frequencies = np.bincount(cells, minlength=n_cells)
+    return frequencies, rng.multinomial(frequencies.sum(), frequencies / frequencies.sum(), size=resamples)
+
+
+def percentile_ci(samples, alpha):
+    return np.percentile(samples, [100 * alpha / 2, 100 * (1 - alpha / 2)], axis=0)
+
+
+def mcnemar(correct_a, correct_b):
+    """
+    McNemar test on per-item correctness: exact binomial when there are
+    fewer than 25 discordant items, chi-square with continuity correction
+    otherwise. Returns (b, c, p-value), with b = only A correct and c = only B.
+    """
+    b = int(np.sum(correct_a & ~correct_b))
+    c = int(np.sum(~correct_a & correct_b))
+    if b + c == 0:
+        return b, c, 1.0
+    if b + c < 25:
+        return b, c, binomtest(b, b + c, 0.5).pvalue
+    return b, c, chi2.sf((abs(b - c) - 1) ** 2 / (b + c), df=1)
+
+
+def item_correct(cells, table):
+    if table == 'results_pairs':
+        return cells == 1
+    return cells // 2 == cells % 2
+
+
+def compare_configs(db_paths, output_csv=None, resamples=DEFAULT_RESAMPLES, alpha=0.05, all_pairs=False, seed=0):
+    """
+    Bootstrap confidence intervals for each config and paired comparisons
+    (paired bootstrap on every metric plus McNemar on correctness). Configs
+    are compared with the first db, or with each other with `all_pairs`.
+    """
+    try:
+        table, names, cells = align(db_paths)
+    except (ValueError, sqlite3.Error, pd.errors.DatabaseError) as e:
+        print(f"Error: {e}")
+        return
+    if len(cells) == 0:
+        print("Error: No items are shared by all databases.")
+        return
+
+    n_cells = CELL_CONFUSION[table].shape[0]
+    rng = np.random.default_rng(seed)
+    rows = []
+
+    for i, name in enumerate(names):
+        frequencies, counts = bootstrap_counts(cells[:, i], n_cells, resamples, rng)
+        point = metrics_from_counts(*confusion(frequencies, table))
+        boot = metrics_from_counts(*confusion(counts, table))
+        for key, label in METRICS:
+            low, high = percentile_ci(boot[key], alpha)
+            rows.append({'kind': 'config', 'config': name, 'baseline': None, 'metric': label,
+                         'estimate': float(point[key]), 'ci_low': low, 'ci_high': high, 'p_value': None,
+                         'n': len(cells)})
+
+    comparisons = combinations(range(len(names)), 2) if all_pairs else ((0, j) for j in range(1, len(names)))
+    for i, j in comparisons:
+        # Joint cell of the two configs, so every resample keeps the items paired
+        joint = cells[:, j] * n_cells + cells[:, i]
+        frequencies, counts = bootstrap_counts(joint, n_cells * n_cells, resamples, rng)
+        frequencies = frequencies.reshape(n_cells, n_cells)
+        counts = counts.reshape(resamples, n_cells, n_cells)
+
+        point_a = metrics_from_counts(*confusion(frequencies.sum(axis=0), table))
+        point_b = metrics_from_counts(*confusion(frequencies.sum(axis=1), table))
+        boot_a = metrics_from_counts(*confusion(counts.sum(axis=1), table))
+        boot_b = metrics_from_counts(*confusion(counts.sum(axis=2), table))
+
+        for key, label in METRICS:
+            diff = boot_b[key] - boot_a[key]
+            low, high = percentile_ci(diff, alpha)
+            p_value = min(1.0, 2 * min(np.mean(diff <= 0), np.mean(diff >= 0)))
+            rows.append({'kind': 'paired_bootstrap', 'config': names[j], 'baseline': names[i], 'metric': label,
+                         'estimate': float(point_b[key] - point_a[key]), 'ci_low': low, 'ci_high': high,
+                         'p_value': p_value, 'n': len(cells)})
+
+        b, c, p_value = mcnemar(item_correct(cells[:, i], table), item_correct(cells[:, j], table))
+        rows.append({'kind': 'mcnemar', 'config': names[j], 'baseline': names[i],
+                     'metric': f'McNemar (only baseline correct: {b}, only config correct: {c})',
+                     'estimate': (c - b) / len(cells), 'ci_low': None, 'ci_high': None, 'p_value': p_value,
+                     'n': len(cells)})
+
+    report = pd.DataFrame(rows)
+    with pd.option_context('display.max_rows', None, 'display.width', 200, 'display.max_colwidth', 60):
+        print(report.to_string(index=False))
+
+    if output_csv:
+        report.to_csv(output_csv, index=False)
+        print(f"Comparison saved to: {output_csv}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bootstrap confidence intervals and paired significance tests (paired bootstrap, McNemar) between result databases.")
+
+    parser.add_argument("db_files", nargs="+", help="SQLite .db files to compare (all single-phrase or all pair results); the first is the baseline")
+    parser.add_argument("--output", help="Path to save the comparison as CSV (optional)", default=None)
+    parser.add_argument("--resamples", type=int, default=DEFAULT_RESAMPLES, help=f"Bootstrap resamples (default: {DEFAULT_RESAMPLES})")
+    parser.add_argument("--alpha", type=float, default=0.05, help="Significance level; the CIs cover 1 - alpha (default: 0.05)")
+    parser.add_argument("--all-pairs", action="store_true", help="Compare every pair of configs instead of each config with the first")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the resamples (default: 0)")
+
+    args = parser.parse_args()
+
+    compare_configs(args.db_files, args.output, max(1, args.resamples), args.alpha, args.all_pairs, args.seed)
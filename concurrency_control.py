@@ -0,0 +1,106 @@
+import csv
+import statistics
+from collections import deque
+import threading
+import time
+
+# Latência mediana tolerada, em múltiplos da linha de base, antes de reduzir o limite
+LATENCY_TOLERANCE = 1.5
+# Fator aplicado ao limite quando há erros ou a latência passa da tolerância
+BACKOFF = 0.75
+# Janelas consideradas na linha de base; mínimos mais antigos são esquecidos
+BASELINE_WINDOWS = 50
+# Respostas mínimas por janela de decisão
+MIN_WINDOW = 4
+
+LOG_COLUMNS = ["elapsed_s", "limit", "median_latency_ms", "baseline_ms", "errors", "window"]
+
+
+class AdaptiveConcurrency:
+    """
+    Limite de requisições simultâneas ajustado por AIMD a partir da latência
+    observada.
+
+    As respostas são agrupadas em janelas de `limit` requisições (no mínimo
+    MIN_WINDOW). Ao fim de cada janela:
+    - houve erro, ou a latência mediana passou de LATENCY_TOLERANCE vezes a
+      linha de base: o limite é multiplicado por BACKOFF;
+    - senão, o limite sobe em 1.
+    A linha de base é a menor mediana das últimas BASELINE_WINDOWS janelas,
+    ou seja, a latência sem fila (cada recuo do AIMD volta a medi-la). Ela é
+    recalculada em cada run, então prompts longos (PunSigns) e curtos
+    (zero-shot) chegam a limites diferentes.
+
+    Cada decisão fica em `history` e, com `log_path`, é anexada a um CSV.
+    """
+
+    def __init__(self, initial=1, min_limit=1, max_limit=16, log_path=None):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(self.max_limit, max(self.min_limit, initial))
+        self.baseline = None
+        self._recent_medians = deque(maxlen=BASELINE_WINDOWS)
+        self.history = []
+        self._window = []
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+        self._log_file = None
+        self._log_writer = None
+        if log_path:
+            self._log_file = open(log_path, 'w', newline='', encoding='utf-8')
+            self._log_writer = csv.writer(self._log_file)
+            self._log_writer.writerow(LOG_COLUMNS)
+
+    def record(self, latency_s, error=False):
+        """Registra uma requisição concluída (latência em segundos) e, ao fim da janela, ajusta o limite."""
+        with self._lock:
+            self._window.append((latency_s, error))
+            if len(self._window) >= max(self.limit, MIN_WINDOW):
+                self._decide_locked()
+
+    def _decide_locked(self):
+        errors = sum(1 for _, error in self._window if error)
+        latencies = [latency for latency, error in self._window if not error]
+        window = len(self._window)
+        self._window = []
+
+        median = statistics.median(latencies) if latencies else None
+        if median is not None:
+            self._recent_medians.append(median)
+            self.baseline = min(self._recent_medians)
+
+        if errors or median is None or median > LATENCY_TOLERANCE * self.baseline:
+            self.limit = max(self.min_limit, int(self.limit * BACKOFF))
+        else:
+            self.limit = min(self.max_limit, self.limit + 1)
+
+        entry = (
+            round(time.monotonic() - self._started, 1), self.limit,
+            round(median * 1000, 1) if median is not None else None,
+            round(self.baseline * 1000, 1) if self.baseline is not None else None,
+            errors, window
+        )
+        self.history.append(entry)
+        if self._log_writer:
+            self._log_writer.writerow(entry)
+            self._log_file.flush()
+
+    def reset_baseline(self):
+        """Descarta a linha de base e a janela atual (ex.: troca de modelo)."""
+        with self._lock:
+            self.baseline = None
+            self._recent_medians.clear()
+            self._window = []
+
+    def report(self):
+        if not self.history:
+            return
+        limits = [entry[1] for entry in self.history]
+        print(f"Concorrência adaptativa: limite final {self.limit} "
+              f"(mín. {min(limits)}, máx. {max(limits)}, média {statistics.mean(limits):.1f} "
+              f"em {len(self.history)} janelas).")
+
+    def close(self):
+        if self._log_file:
+            self._log_file.close()
+            self._log_file = None
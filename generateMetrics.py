@@ -1,30 +1,78 @@
 import sqlite3
+import numpy as np
 import pandas as pd
-from sklearn.metrics import confusion_matrix, f1_score, accuracy_score, precision_score, recall_score
 import os
 import argparse
+import time
 
-def clean_label(label):
+from response_parsing import label_codes
+
+def clean_labels(labels):
     """
-    Normalizes the label strings to handle inconsistencies.
+    Normalizes a Series of label strings to handle inconsistencies, in one vectorized pass.
     Input formats handled: 'Trocadilho', 'Não trocadilho', "Trocadilho'", etc.
     Returns: 1 for Trocadilho (Positive), 0 for Não Trocadilho (Negative), -1 for Unknown
     """
-    if pd.isna(label) or label == "":
-        return -1
-    
-    txt = str(label).lower().strip()
-    
-    txt = txt.replace("'", "").replace('"', "")
-    
-    if "não" in txt or "nao" in txt:
-        return 0 # Class: Não Trocadilho
-    elif "trocadilho" in txt:
-        return 1 # Class: Trocadilho
-    else:
-        return -1 # Unrecognized label
+    return label_codes(labels)
+
+def label_case_sql(column):
+    """
+    SQL CASE with the same rules as clean_labels, so SQLite can normalize the labels itself.
+    LIKE is only case-insensitive for ASCII, hence the explicit 'nÃo'.
+    """
+    return (f"CASE WHEN {column} LIKE '%não%' OR {column} LIKE '%nÃo%' OR {column} LIKE '%nao%' THEN 0 "
+            f"WHEN {column} LIKE '%trocadilho%' THEN 1 ELSE -1 END")
+
+def confusion_counts(y_true, y_pred):
+    """(tn, fp, fn, tp) for 0/1 arrays, from a single bincount pass."""
+    counts = np.bincount(2 * np.asarray(y_true, dtype=np.int64) + np.asarray(y_pred, dtype=np.int64), minlength=4)
+    return tuple(int(c) for c in counts)
 
-def analyze_database(db_path, output_csv, debug_csv=None):
+def sql_confusion_counts(conn, table_name):
+    """
+    Normalizes the labels and builds the confusion counts inside SQLite, without loading the rows.
+    Returns ((tn, fp, fn, tp), number of unknown rows, sample of unknown extracted labels).
+    """
+    query = f"""
+    SELECT y_true, y_pred, COUNT(*) FROM (
+        SELECT {label_case_sql('correct_label')} AS y_true, {label_case_sql('extracted_label')} AS y_pred
+        FROM {table_name}
+    ) GROUP BY y_true, y_pred
+    """
+    counts = {(y_true, y_pred): n for y_true, y_pred, n in conn.execute(query)}
+    unknown = sum(n for (y_true, y_pred), n in counts.items() if y_true == -1 or y_pred == -1)
+    sample = [row[0] for row in conn.execute(
+        f"SELECT DISTINCT extracted_label FROM {table_name} "
+        f"WHERE {label_case_sql('correct_label')} = -1 OR {label_case_sql('extracted_label')} = -1 LIMIT 20"
+    )] if unknown else []
+    return tuple(counts.get(cell, 0) for cell in ((0, 0), (0, 1), (1, 0), (1, 1))), unknown, sample
+
+def metrics_from_counts(tn, fp, fn, tp):
+    """
+    All metrics derived from the confusion matrix. Divisions by zero give 0,
+    as sklearn's scorers do. Counts can also be NumPy arrays (e.g. one entry
+    per bootstrap resample); the metrics then come back as arrays.
+    """
+    def ratio(a, b):
+        a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+        return np.divide(a, b, out=np.zeros(np.broadcast(a, b).shape), where=b != 0)
+
+    def f1(precision, recall):
+        return ratio(2 * precision * recall, precision + recall)
+
+    precision_pos, recall_pos = ratio(tp, tp + fp), ratio(tp, tp + fn)
+    precision_neg, recall_neg = ratio(tn, tn + fn), ratio(tn, tn + fp)
+    return {
+        'f1_pos': f1(precision_pos, recall_pos),
+        'f1_neg': f1(precision_neg, recall_neg),
+        'accuracy': ratio(tp + tn, tp + tn + fp + fn),
+        'precision_pos': precision_pos,
+        'recall_pos': recall_pos,
+        'precision_neg': precision_neg,
+        'recall_neg': recall_neg,
+    }
+
+def analyze_database(db_path, output_csv, debug_csv=None, in_sql=False):
     if not os.path.exists(db_path):
         print(f"Error: Database file '{db_path}' not found.")
         return
@@ -40,46 +88,69 @@ def analyze_database(db_path, output_csv, debug_csv=None):
             print("Error: No tables found in the database.")
             return
 
-        table_name = tables[0][0] 
+        table_names = [row[0] for row in tables]
+        if 'results' not in table_names:
+            if 'results_pairs' in table_names:
+                print("Error: This is a pair-mode database; use generateMetricsPairs.py (or metrics_report.py).")
+            else:
+                print(f"Error: No 'results' table found (tables: {', '.join(table_names)}).")
+            return
+        table_name = 'results'
         print(f"Reading from table: '{table_name}'...")
 
-        query = f"SELECT id, original_text, correct_label, extracted_label FROM {table_name}"
-        df = pd.read_sql_query(query, conn)
-        conn.close()
+        if in_sql:
+            # Labels are normalized and counted by SQLite; only the 2x2 counts come back
+            if debug_csv:
+                print("Warning: --debug is ignored with --sql (rows are not loaded).")
+            (tn, fp, fn, tp), unknown, sample = sql_confusion_counts(conn, table_name)
+            conn.close()
+            if unknown + tn + fp + fn + tp == 0:
+                print("Table is empty.")
+                return
+        else:
+            query = f"SELECT id, original_text, correct_label, extracted_label FROM {table_name}"
+            df = pd.read_sql_query(query, conn)
+            conn.close()
 
-        if df.empty:
-            print("Table is empty.")
-            return
-        
-        df['y_true'] = df['correct_label'].apply(clean_label)
-        df['y_pred'] = df['extracted_label'].apply(clean_label)
+            if df.empty:
+                print("Table is empty.")
+                return
+
+            df['y_true'] = clean_labels(df['correct_label'])
+            df['y_pred'] = clean_labels(df['extracted_label'])
+
+            if debug_csv:
+                df.to_csv(debug_csv, index=False)
+                print(f"Intermediate debug data saved to: {debug_csv}")
 
-        if debug_csv:
-            df.to_csv(debug_csv, index=False)
-            print(f"Intermediate debug data saved to: {debug_csv}")
+            valid = (df['y_true'] != -1) & (df['y_pred'] != -1)
+            unknown = int((~valid).sum())
+            sample = df.loc[~valid, 'extracted_label'].unique() if unknown else []
+            tn, fp, fn, tp = confusion_counts(df.loc[valid, 'y_true'], df.loc[valid, 'y_pred'])
 
-        unknown_rows = df[(df['y_true'] == -1) | (df['y_pred'] == -1)]
-        if not unknown_rows.empty:
-            print(f"Warning: {len(unknown_rows)} rows contained unrecognized labels and were excluded from calculation.")
-            print("Sample of excluded labels:", unknown_rows['extracted_label'].unique())
-            
-        valid_df = df[(df['y_true'] != -1) & (df['y_pred'] != -1)]
+        if unknown:
+            print(f"Warning: {unknown} rows contained unrecognized labels and were excluded from calculation.")
+            print("Sample of excluded labels:", sample)
 
-        if valid_df.empty:
+        total = tn + fp + fn + tp
+        if total == 0:
             print("Error: No valid data remains after cleaning.")
             return
 
-        y_true = valid_df['y_true']
-        y_pred = valid_df['y_pred']
+        results_df = metrics_table(tn, fp, fn, tp)
+
+        results_df.to_csv(output_csv, index=False)
+        
+        print(f"Results saved to: {output_csv}")
 
-        f1_scores = f1_score(y_true, y_pred, labels=[0, 1], average=None)
-        accuracy = accuracy_score(y_true, y_pred)
-        precision = precision_score(y_true, y_pred, labels=[0, 1], average=None)
-        recall = recall_score(y_true, y_pred, labels=[0, 1], average=None)
+    except Exception as e:
+        print(f"An error occurred: {e}")
 
-        tn, fp, fn, tp = confusion_matrix(y_true, y_pred, labels=[0, 1]).ravel()
+def metrics_table(tn, fp, fn, tp):
+    """The metrics CSV layout (one row per metric) for a confusion matrix."""
+    metrics = {name: float(value) for name, value in metrics_from_counts(tn, fp, fn, tp).items()}
 
-        results = {
+    results = {
             'Metric': [
                 'F1 Score (Trocadilho)', 
                 'F1 Score (Não Trocadilho)',
@@ -95,25 +166,101 @@ def analyze_database(db_path, output_csv, debug_csv=None):
                 'Total Samples'
             ],
             'Value': [
-                f1_scores[1], 
-                f1_scores[0],
-                accuracy, 
-                precision[1], 
-                recall[1], 
-                precision[0], 
-                recall[0],
-                tp, tn, fp, fn, len(valid_df)
+                metrics['f1_pos'], 
+                metrics['f1_neg'],
+                metrics['accuracy'], 
+                metrics['precision_pos'], 
+                metrics['recall_pos'], 
+                metrics['precision_neg'], 
+                metrics['recall_neg'],
+                tp, tn, fp, fn, tn + fp + fn + tp
             ]
         }
         
-        results_df = pd.DataFrame(results)
+    return pd.DataFrame(results)
 
-        results_df.to_csv(output_csv, index=False)
-        
-        print(f"Results saved to: {output_csv}")
+def read_new_counts(conn, table_name, last_id):
+    """
+    Confusion counts of the rows added since `last_id`, aggregated by SQLite.
+    Returns (new last_id, np.array([tn, fp, fn, tp]), unknown rows).
+    In results_pairs every pair counts as one pun and one non-pun instance, as in generateMetricsPairs.
+    """
+    counts = np.zeros(4, dtype=np.int64)
+    max_id = conn.execute(f"SELECT MAX(id) FROM {table_name}").fetchone()[0] or 0
+    if max_id <= last_id:
+        return last_id, counts, 0
 
-    except Exception as e:
-        print(f"An error occurred: {e}")
+    unknown = 0
+    if table_name == 'results_pairs':
+        query = "SELECT is_correct, COUNT(*) FROM results_pairs WHERE id > ? AND id <= ? GROUP BY is_correct"
+        for is_correct, n in conn.execute(query, (last_id, max_id)):
+            counts += n * (np.array([1, 0, 0, 1]) if is_correct == 1 else np.array([0, 1, 1, 0]))
+    else:
+        query = f"""
+        SELECT {label_case_sql('correct_label')} AS y_true, {label_case_sql('extracted_label')} AS y_pred, COUNT(*)
+        FROM {table_name} WHERE id > ? AND id <= ? GROUP BY y_true, y_pred
+        """
+        for y_true, y_pred, n in conn.execute(query, (last_id, max_id)):
+            if y_true == -1 or y_pred == -1:
+                unknown += n
+            else:
+                counts[2 * y_true + y_pred] += n
+    return max_id, counts, unknown
+
+def watch_database(db_path, output_csv, interval=10.0):
+    """
+    Follows a run in progress: every `interval` seconds, reads only the rows
+    added since the last check (by id) and updates the confusion counts,
+    printing running accuracy, F1 and throughput. Stops on Ctrl-C and then
+    saves the metrics of everything seen to `output_csv`.
+    """
+    if not os.path.exists(db_path):
+        print(f"Error: Database file '{db_path}' not found.")
+        return
+
+    conn = sqlite3.connect(db_path)
+    tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table';")]
+    table_name = next((t for t in ("results", "results_pairs") if t in tables), None)
+    if table_name is None:
+        print("Error: No results or results_pairs table found in the database.")
+        conn.close()
+        return
+    print(f"Watching table '{table_name}' every {interval:g} s (Ctrl-C to stop)...")
+
+    counts = np.zeros(4, dtype=np.int64)
+    unknown = rows = last_id = 0
+    started_at = last_check = time.monotonic()
+    try:
+        while True:
+            last_id, new_counts, new_unknown = read_new_counts(conn, table_name, last_id)
+            now = time.monotonic()
+            new_rows = int(new_counts.sum()) + new_unknown
+            if table_name == 'results_pairs':
+                new_rows //= 2
+            counts += new_counts
+            unknown += new_unknown
+            rows += new_rows
+
+            if new_rows or last_check == started_at:
+                metrics = metrics_from_counts(*counts)
+                # The first read only catches up with the rows written before the watch started
+                progress = (f"+{new_rows}, {new_rows / (now - last_check):.1f} rows/s" if last_check != started_at
+                            else "already in the db")
+                print(f"[{time.strftime('%H:%M:%S')}] {rows} rows ({progress}) | "
+                      f"accuracy {float(metrics['accuracy']):.4f} | F1 pun {float(metrics['f1_pos']):.4f} | "
+                      f"F1 non-pun {float(metrics['f1_neg']):.4f} | unknown {unknown}", flush=True)
+            last_check = now
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        conn.close()
+
+    elapsed = time.monotonic() - started_at
+    print(f"\nStopped after {elapsed:.0f} s; {rows} rows seen.")
+    if counts.sum():
+        metrics_table(*counts).to_csv(output_csv, index=False)
+        print(f"Results saved to: {output_csv}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Calculate confusion matrix and F1 score from a SQLite database.")
@@ -121,7 +268,12 @@ if __name__ == "__main__":
     parser.add_argument("db_file", help="Path to the input SQLite .db file")
     parser.add_argument("output_csv", help="Path for the output CSV file")
     parser.add_argument("--debug", help="Path to save the intermediate CSV for debugging (optional)", default=None)
+    parser.add_argument("--sql", action="store_true", help="Normalize labels and count the confusion matrix inside SQLite, without loading the rows")
+    parser.add_argument("--watch", type=float, nargs="?", const=10.0, default=None, metavar="SECONDS", help="Follow a run in progress, printing running metrics every SECONDS (default: 10) until Ctrl-C")
     
     args = parser.parse_args()
     
-    analyze_database(args.db_file, args.output_csv, args.debug)
\ No newline at end of file
+    if args.watch is not None:
+        watch_database(args.db_file, args.output_csv, max(0.1, args.watch))
+    else:
+        analyze_database(args.db_file, args.output_csv, args.debug, args.sql)
\ No newline at end of file
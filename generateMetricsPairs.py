@@ -5,19 +5,74 @@ from sklearn.metrics import confusion_matrix, f1_score, accuracy_score, precisio
 import os
 import argparse
 
-def analyze_database(db_path, output_csv, debug_csv=None):
+from pairs_from_phrases import derive_pair_verdicts
+from utils.pair_index import load_pair_index
+
+def position_bias_metrics(df_pairs):
+    """
+    Position-bias metrics for runs that store pun_position (1 or 2): accuracy
+    by position, how often the model picks phrase 1, and, for pairs run in
+    both orders (--both-orders), how often the verdict survives the swap.
+    Returns a list of (metric, value); empty for older databases.
+    """
+    if 'pun_position' not in df_pairs.columns:
+        return []
+    df = df_pairs.dropna(subset=['pun_position'])
+    if df.empty:
+        return []
+
+    metrics = []
+    for position in (1, 2):
+        at_position = df[df['pun_position'] == position]
+        if not at_position.empty:
+            metrics.append((f'Accuracy (Pun at position {position})', at_position['is_correct'].mean()))
+
+    # The model picked phrase 1 when it was right and the pun was first, or wrong and the pun was second
+    answered = df[df['error_flag'] == 0]
+    if not answered.empty:
+        picked_first = (answered['is_correct'] == 1) == (answered['pun_position'] == 1)
+        metrics.append(('Picked Position 1 Rate', picked_first.mean()))
+
+    by_order = df.drop_duplicates(['pair_id', 'pun_position']).pivot(
+        index='pair_id', columns='pun_position', values='is_correct'
+    )
+    if {1, 2} <= set(by_order.columns):
+        both = by_order.dropna(subset=[1, 2])
+        if not both.empty:
+            metrics.append(('Order-Consistent Pairs', (both[1] == both[2]).mean()))
+            metrics.append(('Pairs Run in Both Orders', len(both)))
+    return metrics
+
+def pairs_from_phrases(db_path, pairs_csv):
+    """
+    Pair verdicts derived from a single-phrase results db (see
+    pairs_from_phrases.derive_pair_verdicts), for the complete pairs of
+    `pairs_csv`. Pairs with a half missing from the db are left out.
+    """
+    pairs = load_pair_index(pairs_csv).pairs
+    verdicts, missing = derive_pair_verdicts(pairs, db_path)
+    print(f"Pares derivados das frases: {len(verdicts)} de {len(pairs)} ({len(missing)} com alguma frase sem resultado).")
+    return verdicts.rename_axis('pair_id').reset_index()[['pair_id', 'is_correct', 'error_flag']]
+
+def analyze_database(db_path, output_csv, debug_csv=None, pairs_csv=None):
     if not os.path.exists(db_path):
         print(f"Erro: Arquivo de banco de dados '{db_path}' não encontrado.")
         return
 
     try:
-        conn = sqlite3.connect(db_path)
-        
-        # 1. Ler apenas as colunas necessárias da tabela results_pairs
-        # Filtramos onde error_flag = 0 (ignoramos erros de parse/API)
-        query = "SELECT id, pair_id, is_correct FROM results_pairs"
-        df_pairs = pd.read_sql_query(query, conn)
-        conn.close()
+        if pairs_csv:
+            # Banco de frases (results): os pares são montados a partir das duas metades
+            df_pairs = pairs_from_phrases(db_path, pairs_csv)
+        else:
+            conn = sqlite3.connect(db_path)
+
+            # 1. Ler apenas as colunas necessárias da tabela results_pairs
+            # Filtramos onde error_flag = 0 (ignoramos erros de parse/API)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(results_pairs)")}
+            extra = ", error_flag, pun_position" if 'pun_position' in columns else ""
+            query = f"SELECT id, pair_id, is_correct{extra} FROM results_pairs"
+            df_pairs = pd.read_sql_query(query, conn)
+            conn.close()
 
         if df_pairs.empty:
             print("Aviso: A tabela está vazia ou todos os registros contêm erros (error_flag=1).")
@@ -93,6 +148,10 @@ def analyze_database(db_path, output_csv, debug_csv=None):
             ]
         }
         
+        for metric, value in position_bias_metrics(df_pairs):
+            results['Metric'].append(metric)
+            results['Value'].append(value)
+
         results_df = pd.DataFrame(results)
 
         # Salvar
@@ -115,7 +174,8 @@ if __name__ == "__main__":
     parser.add_argument("db_file", help="Caminho para o arquivo .db")
     parser.add_argument("output_csv", help="Caminho para salvar o CSV de métricas")
     parser.add_argument("--debug", help="Caminho para salvar CSV de debug (opcional)", default=None)
+    parser.add_argument("--from-phrases", metavar="PAIRS_CSV", help="Trata db_file como banco de frases (results) e avalia os pares deste CSV a partir das duas metades", default=None)
     
     args = parser.parse_args()
     
-    analyze_database(args.db_file, args.output_csv, args.debug)
\ No newline at end of file
+    analyze_database(args.db_file, args.output_csv, args.debug, args.from_phrases)
\ No newline at end of file
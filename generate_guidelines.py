@@ -1,9 +1,16 @@
 import sys
-import ollama
+import argparse
+from llm_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_MB, open_cache
+from ollama_pool import open_pool
 
-def run_prompt_from_file(prompt_filepath, output_filepath):
+MODEL_NAME = "llama3"
+
+def run_prompt_from_file(prompt_filepath, output_filepath, cache_path=DEFAULT_CACHE_PATH, cache_max_mb=DEFAULT_MAX_MB,
+                         model=MODEL_NAME, ollama_hosts=None):
     """
     Lê um prompt de um arquivo e executa o ollama.generate com ele.
+    A resposta é reaproveitada do cache em `cache_path` (None desativa).
+    A requisição vai para o endpoint saudável menos carregado entre `ollama_hosts` (ver OllamaPool).
     """
     try:
         with open(prompt_filepath, 'r', encoding='utf-8') as f:
@@ -24,13 +31,17 @@ def run_prompt_from_file(prompt_filepath, output_filepath):
     print(f"--- Prompt carregado de '{prompt_filepath}' ---")
     print("--- Gerando resposta... ---")
 
+    cache = open_cache(cache_path, cache_max_mb)
+    pool = open_pool(ollama_hosts)
+
     try:
-        response = ollama.generate(
-            model="llama3",
+        request = dict(
+            model=model,
             prompt=prompt_text,
             options=options,
             stream=False
         )
+        response = cache.generate(pool.generate, **request) if cache else pool.generate(**request)
 
         response_text = response["response"]
         print("\n--- Resposta do Modelo ---")
@@ -47,12 +58,22 @@ def run_prompt_from_file(prompt_filepath, output_filepath):
     except Exception as e:
         print(f"ERRO: Ocorreu um erro ao chamar a API do Ollama: {e}")
 
+    if cache:
+        cache.report()
+        cache.close()
+
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Uso: python run_prompt_file.py <caminho_para_seu_prompt.txt> <arquivo_resposta.txt>")
-        sys.exit(1)
-    
-    input_path = sys.argv[1]
-    output_path = sys.argv[2]
-    
-    run_prompt_from_file(input_path, output_path)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Executa um prompt de arquivo no Llama 3 e salva a resposta.")
+
+    parser.add_argument("prompt_file", help="Caminho para o arquivo de prompt")
+    parser.add_argument("output_file", help="Caminho para salvar a resposta do modelo")
+    parser.add_argument("--model", default=MODEL_NAME, help=f"Modelo do Ollama (padrão: {MODEL_NAME})")
+    parser.add_argument("--ollama-host", action="append", help="Endpoint do Ollama (repetível ou separado por vírgulas); as requisições vão para o menos carregado (padrão: OLLAMA_HOST)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help=f"Banco do cache de respostas (padrão: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--no-cache", action="store_true", help="Não consulta nem grava o cache de respostas")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_MAX_MB, help=f"Tamanho máximo do cache em MB (padrão: {DEFAULT_MAX_MB})")
+
+    args = parser.parse_args()
+
+    run_prompt_from_file(args.prompt_file, args.output_file, None if args.no_cache else args.cache, args.cache_max_mb,
+                         args.model, args.ollama_host)
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import ollama
+
+DEFAULT_CACHE_PATH = os.path.join("cache", "llm_responses.db")
+DEFAULT_MAX_MB = 512
+
+# Campos da resposta do Ollama que não valem o espaço em disco
+_DROPPED_FIELDS = ("context",)
+
+
+class ResponseCache:
+    """
+    Cache em disco (SQLite) das respostas do Ollama, endereçado pelo hash
+    SHA-256 da requisição completa (modelo, system, prompt, opções...).
+
+    Como todas as configs usam temperature=0 e seed=42, a mesma requisição
+    sempre produz a mesma resposta, então o cache pode ser compartilhado
+    entre execuções, configs e scripts. O tamanho é limitado a `max_mb`
+    megabytes, descartando as entradas usadas há mais tempo (LRU).
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_mb=DEFAULT_MAX_MB):
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            response TEXT,
+            size INTEGER,
+            last_used REAL
+        )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON responses (last_used)")
+        self.conn.commit()
+
+        self._total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(request):
+        """
+        Hash estável da requisição. `stream=False` fica de fora; `stream=True`
+        entra na chave porque o modo stream pode interromper a geração antes do
+        fim, e essa resposta parcial não deve ser servida ao modo completo.
+        """
+        payload = {k: v for k, v in request.items() if v is not None and not (k == "stream" and not v)}
+        encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            row = self.conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            response = json.loads(row[0])
+            response["cache_hit"] = True
+            return response
+
+    def put(self, key, response):
+        data = response.model_dump() if hasattr(response, "model_dump") else dict(response)
+        data.pop("cache_hit", None)
+        for field in _DROPPED_FIELDS:
+            data.pop(field, None)
+        encoded = json.dumps(data, ensure_ascii=False, default=str)
+        size = len(encoded.encode("utf-8"))
+
+        with self._lock:
+            old = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if old is not None:
+                self._total_bytes -= old[0]
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, encoded, size, time.time())
+            )
+            self._total_bytes += size
+            self._evict_locked()
+            self.conn.commit()
+
+    def _evict_locked(self):
+        while self._total_bytes > self.max_bytes:
+            victims = self.conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_used LIMIT 100"
+            ).fetchall()
+            if not victims:
+                break
+            for key, size in victims:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_bytes -= size
+                self.evictions += 1
+
+    def generate(self, generate_fn=ollama.generate, **request):
+        """
+        Igual a `generate_fn(**request)`, mas devolve a resposta do cache quando
+        a mesma requisição já foi respondida antes.
+        """
+        key = self.make_key(request)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        response = generate_fn(**request)
+        self.put(key, response)
+        return response
+
+    def report(self):
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100) if total else 0.0
+        print(f"Cache de respostas ({self.path}): {self.hits} hits, {self.misses} misses "
+              f"({rate:.1f}% de acerto), {self.evictions} removidas, "
+              f"{self._total_bytes / (1024 * 1024):.1f} MB em disco.")
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+def open_cache(path, max_mb=DEFAULT_MAX_MB):
+    """Abre o cache em `path`, ou devolve None se o cache estiver desativado (path vazio)."""
+    if not path:
+        return None
+    return ResponseCache(path, max_mb)
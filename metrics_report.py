@@ -0,0 +1,177 @@
+import sqlite3
+import pandas as pd
+import os
+import argparse
+import json
+from multiprocessing import Pool
+
+from generateMetrics import metrics_from_counts, read_new_counts
+
+DEFAULT_CACHE_PATH = os.path.join(".", "cache", "metrics_report.json")
+
+# Table that identifies each mode, and the columns its metrics need
+MODES = {
+    "results": ("single", ["id", "correct_label", "extracted_label"]),
+    "results_pairs": ("pair", ["id", "is_correct"]),
+}
+
+LEADERBOARD_COLUMNS = [
+    "db", "mode", "rows", "accuracy", "f1_pun", "f1_non_pun", "precision_pun", "recall_pun",
+    "precision_non_pun", "recall_non_pun", "unknown_labels", "modified", "error"
+]
+
+
+def discover(root):
+    """Every .db file under `root`, sorted."""
+    paths = []
+    for directory, _, files in os.walk(root):
+        paths += [os.path.join(directory, name) for name in files if name.endswith(".db")]
+    return sorted(paths)
+
+
+def file_signature(db_path):
+    """
+    (mtime_ns, size) of the db and of its -wal file: a run in progress
+    writes to the WAL, which leaves the main file untouched until a checkpoint.
+    """
+    signature = []
+    for path in (db_path, db_path + "-wal"):
+        if os.path.exists(path):
+            stat = os.stat(path)
+            signature += [stat.st_mtime_ns, stat.st_size]
+    return signature
+
+
+def db_metrics(db_path):
+    """
+    One leaderboard row for a db. The mode comes from the schema: a `results`
+    table is a single-phrase run and `results_pairs` a pair run. Dbs without
+    either (response cache, etc.) return None; unreadable or outdated schemas
+    get the reason in `error`.
+    """
+    row = {"db": db_path, "modified": pd.Timestamp(os.path.getmtime(db_path), unit="s").isoformat(timespec="seconds")}
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table';")}
+            table = next((t for t in MODES if t in tables), None)
+            if table is None:
+                return None
+            mode, needed = MODES[table]
+            row["mode"] = mode
+
+            columns = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+            missing = [c for c in needed if c not in columns]
+            if missing:
+                row["error"] = f"missing columns: {', '.join(missing)}"
+                return row
+
+            _, counts, unknown = read_new_counts(conn, table, 0)
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        row["error"] = str(e)
+        return row
+
+    tn, fp, fn, tp = (int(c) for c in counts)
+    metrics = {name: float(value) for name, value in metrics_from_counts(tn, fp, fn, tp).items()}
+    row.update({
+        # In pair mode every pair was unfolded into two instances
+        "rows": (tn + fp + fn + tp) // (2 if mode == "pair" else 1) + unknown,
+        "accuracy": metrics["accuracy"],
+        "f1_pun": metrics["f1_pos"],
+        "f1_non_pun": metrics["f1_neg"],
+        "precision_pun": metrics["precision_pos"],
+        "recall_pun": metrics["recall_pos"],
+        "precision_non_pun": metrics["precision_neg"],
+        "recall_non_pun": metrics["recall_neg"],
+        "unknown_labels": unknown,
+    })
+    return row
+
+
+def load_cache(cache_path):
+    if not cache_path or not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache_path, cache):
+    os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+    with open(cache_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+
+
+def metrics_report(root, output_path, workers=None, cache_path=DEFAULT_CACHE_PATH):
+    """
+    Leaderboard of every result db under `root`, computed in `workers`
+    processes. Metrics of a db are cached by path and reused while its file
+    signature (mtime and size, including the WAL) does not change.
+    Writes CSV, or Parquet when `output_path` ends in .parquet.
+    """
+    paths = discover(root)
+    if not paths:
+        print(f"Error: No .db files found under '{root}'.")
+        return
+
+    cache = load_cache(cache_path)
+    rows, stale = [], []
+    for path in paths:
+        key = os.path.abspath(path)
+        entry = cache.get(key)
+        if entry and entry["signature"] == file_signature(path):
+            rows.append(entry["row"])
+        else:
+            stale.append(path)
+
+    print(f"Found {len(paths)} databases: {len(paths) - len(stale)} cached, {len(stale)} to compute.")
+    if stale:
+        with Pool(min(workers or os.cpu_count(), len(stale))) as pool:
+            for path, row in zip(stale, pool.imap(db_metrics, stale)):
+                cache[os.path.abspath(path)] = {"signature": file_signature(path), "row": row}
+                rows.append(row)
+        if cache_path:
+            save_cache(cache_path, cache)
+
+    rows = [row for row in rows if row is not None]
+    if not rows:
+        print("Error: None of the databases has a results or results_pairs table.")
+        return
+
+    leaderboard = pd.DataFrame(rows).reindex(columns=LEADERBOARD_COLUMNS)
+    leaderboard[["rows", "unknown_labels"]] = leaderboard[["rows", "unknown_labels"]].astype("Int64")
+    leaderboard["db"] = leaderboard["db"].map(lambda path: os.path.relpath(path, root))
+    leaderboard = leaderboard.sort_values(["mode", "accuracy", "db"], ascending=[True, False, True],
+                                          na_position="last")
+
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(leaderboard.drop(columns=["modified"]).to_string(index=False))
+
+    if output_path.endswith(".parquet"):
+        try:
+            leaderboard.to_parquet(output_path, index=False)
+        except ImportError:
+            print("Error: Parquet output needs pyarrow or fastparquet; use a .csv path or install one of them.")
+            return
+    else:
+        leaderboard.to_csv(output_path, index=False)
+    print(f"Leaderboard saved to: {output_path}")
+    return leaderboard
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Metrics leaderboard for every result database under a directory (single and pair modes).")
+
+    parser.add_argument("results_dir", help="Directory searched recursively for .db files")
+    parser.add_argument("output", help="Path for the leaderboard (.csv, or .parquet)")
+    parser.add_argument("--workers", type=int, default=None, help="Processes computing metrics (default: number of CPUs)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help=f"Per-db metrics cache (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--no-cache", action="store_true", help="Recompute every database")
+
+    args = parser.parse_args()
+
+    metrics_report(args.results_dir, args.output, args.workers, None if args.no_cache else args.cache)
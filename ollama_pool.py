@@ -0,0 +1,220 @@
+import threading
+import time
+
+import httpx
+import ollama
+
+# Peso da latência mais recente na média móvel de cada endpoint
+LATENCY_ALPHA = 0.3
+# Falhas seguidas que tiram um endpoint do pool
+EJECT_AFTER_FAILURES = 3
+# Tempo fora do pool na primeira remoção; dobra a cada remoção sem sucesso entre elas
+EJECT_SECONDS = 5.0
+MAX_EJECT_SECONDS = 120.0
+PROBE_TIMEOUT = 3.0
+
+
+def parse_hosts(values):
+    """
+    Lista de hosts a partir de --ollama-host (repetível e/ou separado por
+    vírgulas). Sem hosts, devolve [None]: o cliente padrão, que respeita
+    OLLAMA_HOST.
+    """
+    hosts = [host.strip() for value in values or [] for host in value.split(",") if host.strip()]
+    return hosts or [None]
+
+
+def is_endpoint_failure(error):
+    """Falhas que indicam instância fora do ar ou sobrecarregada (e não uma requisição inválida)."""
+    if isinstance(error, ollama.ResponseError):
+        return error.status_code >= 500 or error.status_code == -1
+    return isinstance(error, (ConnectionError, httpx.TransportError))
+
+
+class Endpoint:
+    def __init__(self, host):
+        self.host = host
+        self.client = ollama.Client(host=host)
+        self.probe_client = ollama.Client(host=host, timeout=PROBE_TIMEOUT)
+        self.in_flight = 0
+        self.latency = None
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.eject_streak = 0
+        self.ejections = 0
+        self.ejected_until = None
+        self.probing = False
+
+    @property
+    def name(self):
+        return self.host or "padrão"
+
+
+class OllamaPool:
+    """
+    Distribui as requisições entre várias instâncias do Ollama. Expõe
+    `generate` e `chat` com a mesma assinatura do módulo `ollama`, então pode
+    ser usado no lugar dele (inclusive como `generate_fn` do cache e do stream).
+
+    Cada requisição vai para o endpoint saudável de menor custo estimado,
+    (em andamento + 1) × latência média recente. Um endpoint com
+    EJECT_AFTER_FAILURES falhas seguidas (conexão ou erro 5xx) sai do pool
+    por um tempo que dobra a cada remoção sem sucesso entre elas; depois
+    disso, um probe leve (/api/tags) decide se ele volta. A requisição que
+    falhou é repetida em outro endpoint. Com todos fora do pool, as
+    requisições esperam o próximo probe em vez de falhar.
+    """
+
+    def __init__(self, hosts, eject_seconds=EJECT_SECONDS, max_eject_seconds=MAX_EJECT_SECONDS):
+        self.endpoints = [Endpoint(host) for host in hosts]
+        self.eject_seconds = eject_seconds
+        self.max_eject_seconds = max_eject_seconds
+        self._lock = threading.Lock()
+
+    def generate(self, **request):
+        return self._call("generate", request)
+
+    def chat(self, **request):
+        return self._call("chat", request)
+
+    def _call(self, method, request):
+        last_error = None
+        tried = []
+        # Cada endpoint tem uma chance por requisição
+        for _ in range(len(self.endpoints)):
+            endpoint = self._acquire(exclude=tried)
+            if endpoint is None:
+                break
+            tried.append(endpoint)
+            started_at = time.monotonic()
+            try:
+                response = getattr(endpoint.client, method)(**request)
+                if request.get("stream"):
+                    # O cliente só conecta ao iterar; o primeiro pedaço confirma o endpoint
+                    first = next(response, None)
+                    return self._stream(endpoint, started_at, first, response)
+            except Exception as e:
+                self._release(endpoint, started_at, e)
+                if not is_endpoint_failure(e):
+                    raise
+                last_error = e
+                continue
+            self._release(endpoint, started_at)
+            return response
+
+        if last_error:
+            raise last_error
+        raise ConnectionError("Nenhum endpoint do Ollama disponível: " +
+                              ", ".join(endpoint.name for endpoint in self.endpoints))
+
+    def _stream(self, endpoint, started_at, first, stream):
+        error = None
+        try:
+            if first is not None:
+                yield first
+            yield from stream
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._release(endpoint, started_at, error)
+
+    def _acquire(self, exclude=()):
+        """
+        Escolhe o endpoint, testando antes os ejetados cujo tempo fora já passou.
+        Os de `exclude` (que já falharam nesta requisição) não são escolhidos;
+        se só restarem eles, devolve None.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                to_probe = next(
+                    (e for e in self.endpoints
+                     if e.ejected_until is not None and e.ejected_until <= now and not e.probing),
+                    None
+                )
+                if to_probe is None:
+                    healthy = [e for e in self.endpoints if e.ejected_until is None]
+                    if not healthy:
+                        if not self.endpoints:
+                            return None
+                        # Se todos estão em probe, espera um pouco pelo resultado
+                        waiting = [e.ejected_until for e in self.endpoints if not e.probing]
+                        delay = max(0.0, min(waiting) - now) if waiting else 0.1
+                    elif all(e in exclude for e in healthy):
+                        return None
+                    else:
+                        healthy = [e for e in healthy if e not in exclude]
+                        known = [e.latency for e in healthy if e.latency is not None]
+                        default_latency = sum(known) / len(known) if known else 1.0
+                        endpoint = min(
+                            healthy,
+                            key=lambda e: ((e.in_flight + 1) * (e.latency or default_latency), e.in_flight)
+                        )
+                        endpoint.in_flight += 1
+                        endpoint.requests += 1
+                        return endpoint
+                else:
+                    to_probe.probing = True
+
+            if to_probe is None:
+                # Todos fora do pool: espera o próximo poder ser testado
+                time.sleep(delay)
+            else:
+                self._probe(to_probe)
+
+    def _probe(self, endpoint):
+        try:
+            endpoint.probe_client.list()
+            healthy = True
+        except Exception:
+            healthy = False
+
+        with self._lock:
+            endpoint.probing = False
+            if healthy:
+                print(f"\nOllama: endpoint {endpoint.name} respondeu ao probe e voltou ao pool.")
+                endpoint.ejected_until = None
+                endpoint.consecutive_failures = 0
+            else:
+                endpoint.eject_streak += 1
+                self._eject_locked(endpoint)
+
+    def _release(self, endpoint, started_at, error=None):
+        elapsed = time.monotonic() - started_at
+        with self._lock:
+            endpoint.in_flight -= 1
+            if error is None:
+                endpoint.consecutive_failures = 0
+                endpoint.eject_streak = 0
+                endpoint.latency = elapsed if endpoint.latency is None else (
+                    LATENCY_ALPHA * elapsed + (1 - LATENCY_ALPHA) * endpoint.latency
+                )
+            elif is_endpoint_failure(error):
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                if endpoint.ejected_until is None and endpoint.consecutive_failures >= EJECT_AFTER_FAILURES:
+                    print(f"\nOllama: endpoint {endpoint.name} removido do pool ({error}).")
+                    endpoint.eject_streak += 1
+                    endpoint.ejections += 1
+                    self._eject_locked(endpoint)
+
+    def _eject_locked(self, endpoint):
+        seconds = min(self.max_eject_seconds, self.eject_seconds * 2 ** (endpoint.eject_streak - 1))
+        endpoint.ejected_until = time.monotonic() + seconds
+
+    def report(self):
+        if len(self.endpoints) < 2 and not any(e.failures for e in self.endpoints):
+            return
+        print("Endpoints do Ollama:")
+        for e in self.endpoints:
+            latency = f"{e.latency * 1000:.0f} ms" if e.latency is not None else "-"
+            status = "fora do pool" if e.ejected_until is not None else "ativo"
+            print(f"  {e.name}: {e.requests} requisições, {e.failures} falhas, {e.ejections} remoções, "
+                  f"latência recente {latency} ({status})")
+
+
+def open_pool(hosts=None):
+    """Pool com os hosts de --ollama-host (ver parse_hosts)."""
+    return OllamaPool(parse_hosts(hosts))
@@ -0,0 +1,112 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from response_parsing import label_codes
+from text_keys import chunked, text_hash
+
+# Início do model_response_raw dos pares derivados; o reparse.py não mexe nessas linhas
+DERIVED_RESPONSE_PREFIX = "[derivado de frases]"
+
+
+def load_phrase_verdicts(db_path, texts):
+    """
+    Rótulos (e confianças, se a coluna existir) do banco de frases para os
+    textos pedidos. Devolve um DataFrame indexado por text_hash com as
+    colunas 'label', 'code' (1, 0 ou -1, ver label_codes) e 'confidence'.
+
+    A busca é pelo text_hash; bancos de versões anteriores, sem essa coluna,
+    são consultados pelo original_text (que também tem índice), sem alterar
+    o banco.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(results)")}
+        if not columns:
+            raise ValueError(f"'{db_path}' não tem a tabela results.")
+        confidence = "confidence" if "confidence" in columns else "NULL"
+        if "text_hash" in columns:
+            key, keys = "text_hash", sorted({text_hash(text) for text in texts})
+        else:
+            key, keys = "original_text", sorted(set(texts))
+        rows = []
+        for block in chunked(keys, 500):
+            placeholders = ", ".join("?" for _ in block)
+            rows += conn.execute(
+                f"SELECT {key}, extracted_label, {confidence} FROM results WHERE {key} IN ({placeholders})",
+                block
+            ).fetchall()
+    finally:
+        conn.close()
+
+    verdicts = pd.DataFrame(rows, columns=["text_hash", "label", "confidence"])
+    if key == "original_text":
+        verdicts["text_hash"] = verdicts["text_hash"].map(text_hash)
+    verdicts = verdicts.drop_duplicates("text_hash")
+    verdicts["code"] = label_codes(verdicts["label"])
+    # pd.Index direto: o set_index do pandas avisa de overflow com hashes de 64 bits nos extremos
+    return verdicts.set_axis(pd.Index(verdicts.pop("text_hash").to_numpy(), name="text_hash"))
+
+
+def pun_probability(code, confidence):
+    """P(trocadilho) de cada frase: a confiança do rótulo, ou 1/0 sem confiança."""
+    confidence = confidence.astype(float)
+    positive = code == 1
+    return np.where(confidence.isna(), positive.astype(float),
+                    np.where(positive, confidence, 1 - confidence))
+
+
+def derive_pair_verdicts(pairs, db_path):
+    """
+    Veredito de cada par a partir das classificações individuais das duas
+    frases num banco de frases (tabela results), sem chamar o LLM.
+
+    `pairs` é um DataFrame indexado por base_id com as colunas 'pun' e 'non'
+    (como PairIndex.pairs). Com p e q a P(trocadilho) da frase .H e da .N, a
+    escolha é a frase .H se p(1-q) > q(1-p), ou seja, se "só a .H é
+    trocadilho" for mais provável que "só a .N é"; `confidence` é essa
+    probabilidade normalizada. Sem confianças, rótulos iguais nas duas
+    frases empatam e o par fica com error_flag=1, como uma resposta sem
+    trocadilho identificável.
+
+    Devolve (vereditos, base_ids pendentes): os vereditos são um DataFrame
+    indexado por base_id com pun_label, non_label, predicted_pun_phrase,
+    is_correct, error_flag e confidence; os pendentes são os pares com
+    alguma frase ausente do banco ou sem rótulo reconhecível, que precisam
+    ir ao LLM.
+    """
+    pun_hash = pairs["pun"].map(text_hash)
+    non_hash = pairs["non"].map(text_hash)
+    verdicts = load_phrase_verdicts(db_path, list(pairs["pun"]) + list(pairs["non"]))
+    verdicts = verdicts[verdicts["code"] != -1]
+
+    pun = verdicts.reindex(pun_hash.to_numpy()).set_axis(pairs.index)
+    non = verdicts.reindex(non_hash.to_numpy()).set_axis(pairs.index)
+    known = pun["code"].notna() & non["code"].notna()
+    pun, non, known_pairs = pun[known], non[known], pairs[known]
+
+    p = pun_probability(pun["code"], pun["confidence"])
+    q = pun_probability(non["code"], non["confidence"])
+    only_pun = p * (1 - q)
+    only_non = q * (1 - p)
+    total = only_pun + only_non
+    decided = only_pun != only_non
+
+    result = pd.DataFrame(index=known_pairs.index)
+    result["pun_label"] = pun["label"]
+    result["non_label"] = non["label"]
+    result["predicted_pun_phrase"] = np.where(
+        decided, np.where(only_pun > only_non, known_pairs["pun"], known_pairs["non"]), None
+    )
+    result["is_correct"] = (decided & (only_pun > only_non)).astype(int)
+    result["error_flag"] = (~decided).astype(int)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result["confidence"] = np.where(decided, np.maximum(only_pun, only_non) / total, np.nan)
+
+    return result, pairs.index[~known]
+
+
+def derived_response(pun_label, non_label):
+    """model_response_raw gravado para um par derivado."""
+    return f"{DERIVED_RESPONSE_PREFIX} .H: {pun_label} | .N: {non_label}"
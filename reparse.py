@@ -0,0 +1,195 @@
+import argparse
+import os
+import sqlite3
+import time
+from multiprocessing import Pool
+
+from classificate_pairs import SCORE_CHOICES, judge_pair
+from classificate_phrases import batch_texts_from_prompt, parse_batch_answers, parse_phrase_answer
+from pairs_from_phrases import DERIVED_RESPONSE_PREFIX
+from response_parsing import SCORE_LABELS
+
+# Linhas lidas do banco e enviadas a cada processo por vez
+BLOCK_SIZE = 5000
+
+# Colunas lidas e colunas reescritas, por tabela
+TABLES = {
+    "results": {
+        "read": ["original_text", "model_input_prompt", "model_response_raw", "extracted_label"],
+        "write": ["extracted_text", "extracted_label"],
+    },
+    "results_pairs": {
+        "read": ["pun_phrase_gold", "non_pun_phrase_gold", "pun_position", "model_response_raw", "is_correct",
+                 "error_flag"],
+        "write": ["predicted_pun_phrase", "is_correct", "error_flag"],
+    },
+}
+
+# Colunas lidas como NULL em bancos que ainda não as têm
+OPTIONAL_COLUMNS = {"pun_position"}
+
+
+def is_json_response(model_response_raw):
+    return model_response_raw.lstrip().startswith("{")
+
+
+def reparse_phrase(original_text, model_input_prompt, model_response_raw):
+    """
+    (extracted_text, extracted_label) com o parser atual, ou None se a linha
+    não puder ser reprocessada (frase não encontrada no prompt do lote).
+    """
+    if model_response_raw.strip() in SCORE_LABELS:
+        # Resposta do modo de pontuação (um único dígito)
+        return parse_phrase_answer(original_text, model_response_raw, scored=True)
+    structured = is_json_response(model_response_raw)
+    texts = batch_texts_from_prompt(model_input_prompt or "")
+    try:
+        if texts and len(texts) > 1:
+            if original_text not in texts:
+                return None
+            answer = parse_batch_answers(texts, model_response_raw, structured)[texts.index(original_text)]
+            if answer is None:
+                raise ValueError("Frase sem resposta válida no lote")
+            return answer
+        return parse_phrase_answer(original_text, model_response_raw, structured)
+    except (SyntaxError, ValueError, TypeError):
+        return "PARSE_ERROR", "PARSE_ERROR"
+
+
+def reparse_pair(gold_pun, gold_non, pun_position, model_response_raw):
+    """
+    (predicted_pun_phrase, is_correct, error_flag) com o parser atual, ou
+    None para respostas JSON de bancos sem pun_position: elas trazem só o
+    índice da frase, e sem a ordem em que o par foi mostrado não há como
+    saber qual frase foi escolhida. O mesmo vale para o modo de pontuação.
+    Pares derivados de um banco de frases (--from-phrases) também voltam None.
+    """
+    if model_response_raw.startswith(DERIVED_RESPONSE_PREFIX):
+        return None
+    scored = model_response_raw.strip() in SCORE_CHOICES
+    if scored or is_json_response(model_response_raw):
+        if pun_position not in (1, 2):
+            return None
+        phrases_list = [gold_pun, gold_non] if pun_position == 1 else [gold_non, gold_pun]
+        return judge_pair(model_response_raw, gold_pun, phrases_list, structured=not scored, scored=scored)
+    return judge_pair(model_response_raw, gold_pun)
+
+
+def reparse_block(args):
+    """Processa um bloco num processo do pool; devolve [(id, valores antigos, valores novos ou None)]."""
+    table, rows = args
+    output = []
+    for id_, *values in rows:
+        if table == "results":
+            original_text, prompt, raw, old_label = values
+            new = reparse_phrase(str(original_text), prompt, raw or "")
+            output.append((id_, old_label, new))
+        else:
+            gold_pun, gold_non, pun_position, raw, old_correct, old_error = values
+            new = reparse_pair(str(gold_pun), str(gold_non), pun_position, raw or "")
+            output.append((id_, (old_correct, old_error), new))
+    return output
+
+
+def iter_blocks(conn, table, block_size=BLOCK_SIZE, missing=()):
+    columns = ", ".join(["id"] + [f"NULL AS {c}" if c in missing else c for c in TABLES[table]["read"]])
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            f"SELECT {columns} FROM {table} WHERE id > ? ORDER BY id LIMIT ?", (last_id, block_size)
+        ).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield table, rows
+
+
+def reparse_database(db_path, in_place=False, output_table=None, workers=None):
+    """
+    Reaplica o parser atual ao model_response_raw de todas as linhas, sem
+    chamar o LLM. As linhas são lidas em blocos por id e divididas entre
+    `workers` processos. Por padrão os valores novos vão para uma cópia da
+    tabela (`<tabela>_reparsed`); com `in_place`, a própria tabela é
+    atualizada.
+    """
+    if not os.path.exists(db_path):
+        print(f"ERRO: Banco '{db_path}' não encontrado.")
+        return
+
+    conn = sqlite3.connect(db_path)
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    table = next((t for t in TABLES if t in existing), None)
+    if table is None:
+        print(f"ERRO: Nenhuma tabela de resultados em '{db_path}'.")
+        conn.close()
+        return
+
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    needed = dict.fromkeys(["id"] + TABLES[table]["read"] + TABLES[table]["write"])
+    missing = [c for c in needed if c not in columns and c not in OPTIONAL_COLUMNS]
+    if missing:
+        print(f"ERRO: '{table}' não tem as colunas {', '.join(missing)} (banco de uma versão antiga do script).")
+        conn.close()
+        return
+
+    target = table if in_place else (output_table or f"{table}_reparsed")
+    if target != table:
+        conn.execute(f"DROP TABLE IF EXISTS {target}")
+        conn.execute(f"CREATE TABLE {target} AS SELECT * FROM {table}")
+    print(f"Reprocessando '{table}' -> '{target}'...")
+
+    assignments = ", ".join(f"{column} = ?" for column in TABLES[table]["write"])
+    update_sql = f"UPDATE {target} SET {assignments} WHERE id = ?"
+
+    # Os blocos são lidos pela thread que alimenta o pool, com conexão própria
+    reader = sqlite3.connect(db_path, check_same_thread=False)
+
+    started_at = time.monotonic()
+    total = changed = skipped = before_bad = after_bad = 0
+    with Pool(workers) as pool:
+        blocks = iter_blocks(reader, table, missing=[c for c in OPTIONAL_COLUMNS if c not in columns])
+        for block in pool.imap(reparse_block, blocks):
+            updates = []
+            for id_, old, new in block:
+                total += 1
+                if table == "results":
+                    before_bad += old == "PARSE_ERROR"
+                    if new is None:
+                        skipped += 1
+                        after_bad += old == "PARSE_ERROR"
+                        continue
+                    after_bad += new[1] == "PARSE_ERROR"
+                    changed += new[1] != old
+                else:
+                    before_bad += old[1] == 1
+                    if new is None:
+                        skipped += 1
+                        after_bad += old[1] == 1
+                        continue
+                    after_bad += new[2] == 1
+                    changed += (new[1], new[2]) != tuple(old)
+                updates.append((*new, id_))
+            conn.executemany(update_sql, updates)
+    conn.commit()
+    conn.close()
+    reader.close()
+
+    problem = "PARSE_ERROR" if table == "results" else "error_flag=1"
+    print(f"{total} linhas reprocessadas em {time.monotonic() - started_at:.1f} s; {changed} mudaram de resultado.")
+    print(f"Linhas com {problem}: {before_bad} antes, {after_bad} depois.")
+    if skipped:
+        reason = "frase não encontrada no prompt do lote" if table == "results" else "resposta só com o índice, sem pun_position, ou par derivado das frases"
+        print(f"{skipped} linhas mantidas como estavam ({reason}).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reaplica o parser atual às respostas gravadas num banco de resultados, sem chamar o LLM.")
+
+    parser.add_argument("db_file", help="Banco SQLite com a tabela results ou results_pairs")
+    parser.add_argument("--in-place", action="store_true", help="Atualiza a própria tabela em vez de gravar numa cópia")
+    parser.add_argument("--output-table", help="Nome da cópia atualizada (padrão: <tabela>_reparsed)")
+    parser.add_argument("--workers", type=int, default=None, help="Processos de parsing (padrão: número de CPUs)")
+
+    args = parser.parse_args()
+
+    reparse_database(args.db_file, args.in_place, args.output_table, args.workers)
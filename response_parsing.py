@@ -0,0 +1,181 @@
+import json
+import math
+import re
+
+import numpy as np
+import pandas as pd
+
+# Tupla final da resposta, ex.: ('Texto da frase', Trocadilho)
+SINGLE_TUPLE_REGEX = re.compile(r'\((["\'])(.*?)\1,\s*(.*?)\s*[\)"\']*\)$')
+
+def parse_single_tuple(response_text):
+    """
+    Extrai a tupla (texto, label) do final da resposta de uma frase.
+    Lança ValueError se o padrão não for encontrado.
+    """
+    match = SINGLE_TUPLE_REGEX.search(response_text)
+    if not match:
+        raise ValueError("Regex não conseguiu encontrar o padrão (texto, label)")
+    return match.group(2), match.group(3).strip().strip('\'"')
+
+def single_tuple_decided(response_text):
+    """Critério de parada do stream: a resposta já termina numa tupla com rótulo reconhecível."""
+    match = SINGLE_TUPLE_REGEX.search(response_text.strip())
+    return bool(match) and 'trocadilho' in match.group(3).lower()
+
+def tuples_decided(count):
+    """Critério de parada do stream: já há `count` tuplas com rótulo reconhecível."""
+    def decided(response_text):
+        labels = [label for _, label in parse_tuples(response_text) if 'trocadilho' in label.lower()]
+        return len(labels) >= count
+    return decided
+
+def parse_tuples(response_text):
+    """
+    Extrai todas as tuplas (texto, rótulo) da resposta, na ordem em que aparecem,
+    lidando corretamente com frases que contêm vírgulas: usa a última vírgula
+    da tupla como separador. Rótulos voltam sem aspas, com a caixa original.
+    """
+    tuples = []
+    for match in re.findall(r"\((.*?)\)", response_text, re.DOTALL):
+        last_comma_index = match.rfind(',')
+
+        if last_comma_index == -1:
+            continue
+
+        text_part = match[:last_comma_index].strip()
+        label_part = match[last_comma_index+1:].strip()
+
+        clean_text = text_part.strip().strip("'").strip('"')
+        clean_label = label_part.strip().strip("'").strip('"')
+        tuples.append((clean_text, clean_label))
+    return tuples
+
+def is_negative_label(label):
+    label = label.lower()
+    return 'não' in label or 'nao' in label or 'non' in label
+
+def label_codes(labels):
+    """
+    Normalização vetorizada de uma Series de rótulos: 1 para Trocadilho, 0
+    para Não trocadilho e -1 para vazio ou não reconhecido. Aspas e caixa
+    são ignoradas; 'não'/'nao' decide antes de 'trocadilho'.
+    """
+    # Os rótulos distintos são poucos: normaliza cada um uma vez e espalha pelos índices
+    positions, uniques = pd.factorize(labels, use_na_sentinel=True)
+    text = pd.Series(uniques, dtype="object").astype("string").str.lower().str.replace("['\"]", "", regex=True)
+    negative = text.str.contains("não|nao", regex=True).fillna(False).to_numpy(dtype=bool)
+    positive = text.str.contains("trocadilho", regex=False).fillna(False).to_numpy(dtype=bool)
+    unique_codes = np.where(negative, 0, np.where(positive, 1, -1)).astype("int8")
+    # Sentinela -1 (NaN/None) vira o código -1
+    codes = np.append(unique_codes, np.int8(-1))[positions]
+    return pd.Series(codes, index=labels.index, dtype="int8")
+
+def normalize_text(t):
+    return t.lower().strip().strip("'").strip('"').strip('.').strip()
+
+def texts_match(predicted, gold):
+    """Mesmo critério do modo de pares: igualdade ou trecho com mais de 4 caracteres."""
+    p_clean = normalize_text(predicted)
+    g_clean = normalize_text(gold)
+    return p_clean == g_clean or (len(p_clean) > 4 and p_clean in g_clean)
+
+# Saída estruturada (parâmetro `format` do Ollama)
+LABELS = ["Trocadilho", "Não trocadilho"]
+
+LABEL_SCHEMA = {
+    "type": "object",
+    "properties": {"rotulo": {"type": "string", "enum": LABELS}},
+    "required": ["rotulo"]
+}
+
+PAIR_SCHEMA = {
+    "type": "object",
+    "properties": {"trocadilho": {"type": "integer", "enum": [1, 2]}},
+    "required": ["trocadilho"]
+}
+
+def batch_label_schema(size):
+    return {
+        "type": "object",
+        "properties": {
+            "rotulos": {
+                "type": "array",
+                "items": {"type": "string", "enum": LABELS},
+                "minItems": size,
+                "maxItems": size
+            }
+        },
+        "required": ["rotulos"]
+    }
+
+def _load_json_object(response_text):
+    data = json.loads(response_text)
+    if not isinstance(data, dict):
+        raise ValueError("Resposta estruturada não é um objeto JSON")
+    return data
+
+def parse_json_label(response_text):
+    """Lê o rótulo de uma resposta {"rotulo": ...}. Lança ValueError se for inválida."""
+    label = _load_json_object(response_text).get("rotulo")
+    if label not in LABELS:
+        raise ValueError(f"Rótulo inválido na resposta estruturada: {label!r}")
+    return label
+
+def parse_json_labels(response_text):
+    """Lê a lista de uma resposta {"rotulos": [...]}; itens inválidos viram None."""
+    labels = _load_json_object(response_text).get("rotulos")
+    if not isinstance(labels, list):
+        raise ValueError("Resposta estruturada sem a lista 'rotulos'")
+    return [label if label in LABELS else None for label in labels]
+
+def parse_json_pair(response_text):
+    """Lê o índice (1 ou 2) da frase apontada como trocadilho em {"trocadilho": n}."""
+    index = _load_json_object(response_text).get("trocadilho")
+    if index not in (1, 2):
+        raise ValueError(f"Índice inválido na resposta estruturada: {index!r}")
+    return index
+
+def json_decided(response_text):
+    """Critério de parada do stream no modo estruturado: o JSON já está completo."""
+    try:
+        json.loads(response_text)
+    except ValueError:
+        return False
+    return True
+
+# Modo de pontuação: a resposta é um único dígito restrito por esquema, e a
+# confiança vem das log-probabilidades desse token
+SCORE_LABELS = {"1": "Trocadilho", "0": "Não trocadilho"}
+SCORE_SCHEMA = {"type": "integer", "enum": [0, 1]}
+PAIR_SCORE_SCHEMA = {"type": "integer", "enum": [1, 2]}
+
+def parse_score_choice(response_text, choices):
+    """Lê o dígito da resposta no modo de pontuação. Lança ValueError se não for uma das `choices`."""
+    choice = response_text.strip()
+    if choice not in choices:
+        raise ValueError(f"Resposta inválida no modo de pontuação: {response_text!r}")
+    return choice
+
+def score_confidence(choice, logprobs, choices):
+    """
+    Probabilidade de `choice` normalizada entre as `choices`, a partir das
+    log-probabilidades do token da resposta (campo `logprobs` do Ollama).
+    Se só a do token escolhido vier, usa exp(logprob) dele. Devolve None
+    quando o servidor não devolve log-probabilidades.
+    """
+    entry = next((e for e in logprobs or [] if e["token"].strip() in choices), None)
+    if entry is None:
+        return None
+
+    best = {}
+    for candidate in [entry] + list(entry.get("top_logprobs") or []):
+        token = candidate["token"].strip()
+        if token in choices:
+            best[token] = max(best.get(token, float("-inf")), candidate["logprob"])
+    if choice not in best:
+        return None
+    if len(best) == 1:
+        return math.exp(best[choice])
+    total = sum(math.exp(logprob) for logprob in best.values())
+    return math.exp(best[choice]) / total
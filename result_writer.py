@@ -0,0 +1,105 @@
+import atexit
+import sqlite3
+import threading
+import time
+
+
+class ResultWriter:
+    """
+    Escritor em lote para as tabelas de resultados (results / results_pairs).
+
+    Abre o SQLite em modo WAL e agrupa os INSERTs em transações, fazendo
+    commit a cada `batch_size` linhas ou quando a linha pendente mais antiga
+    tiver mais de `flush_interval` segundos. O prazo é verificado a cada
+    write() e também por uma thread em segundo plano, então linhas pendentes
+    são gravadas no prazo mesmo que nenhuma linha nova chegue (retries,
+    backoff, lotes lentos). O lote pendente é gravado ao sair do bloco
+    `with` (inclusive por Ctrl-C) e no encerramento do interpretador, então
+    uma queda perde no máximo um lote.
+    """
+
+    def __init__(self, db_path, table, columns, batch_size=50, flush_interval=5.0, ignore_duplicates=False):
+        self.db_path = db_path
+        self.table = table
+        self.columns = list(columns)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+
+        verb = "INSERT OR IGNORE" if ignore_duplicates else "INSERT"
+        placeholders = ", ".join("?" for _ in self.columns)
+        self.insert_sql = f"{verb} INTO {table} ({', '.join(self.columns)}) VALUES ({placeholders})"
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # Em WAL, synchronous=NORMAL só faz fsync no checkpoint e continua seguro contra quedas
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+
+        self._pending = []
+        self._oldest_pending = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self.rows_written = 0
+
+        self._stop = threading.Event()
+        self._timer = None
+        if flush_interval and flush_interval > 0:
+            self._timer = threading.Thread(target=self._flush_when_due, name=f"ResultWriter-{table}", daemon=True)
+            self._timer.start()
+
+        atexit.register(self.close)
+
+    def write(self, values):
+        """Enfileira uma linha (tupla na ordem de `columns`) e faz commit se o lote encheu ou expirou."""
+        with self._lock:
+            if not self._pending:
+                self._oldest_pending = time.monotonic()
+            self._pending.append(tuple(values))
+
+            if (len(self._pending) >= self.batch_size
+                    or time.monotonic() - self._oldest_pending >= self.flush_interval):
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_when_due(self):
+        # Acorda algumas vezes por intervalo, para o atraso além do prazo ficar pequeno
+        while not self._stop.wait(min(self.flush_interval / 4, 1.0)):
+            with self._lock:
+                if self._pending and time.monotonic() - self._oldest_pending >= self.flush_interval:
+                    try:
+                        self._flush_locked()
+                    except sqlite3.Error as e:
+                        # As linhas continuam pendentes; o próximo write() ou close() tenta de novo
+                        print(f"\nAVISO: commit periódico em '{self.table}' falhou: {e}")
+
+    def _flush_locked(self):
+        if not self._pending or self._closed:
+            return
+        with self.conn:
+            self.conn.executemany(self.insert_sql, self._pending)
+        self.rows_written += len(self._pending)
+        self._pending = []
+        self._oldest_pending = None
+
+    def close(self):
+        self._stop.set()
+        if self._timer is not None and self._timer is not threading.current_thread():
+            self._timer.join()
+        with self._lock:
+            if self._closed:
+                return
+            try:
+                self._flush_locked()
+            finally:
+                self._closed = True
+                self.conn.close()
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -0,0 +1,106 @@
+import json
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import httpx
+import ollama
+
+from result_writer import ResultWriter
+
+DEFAULT_MAX_ATTEMPTS = 5
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+
+# Status HTTP que indicam falha passageira do servidor
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+DEAD_LETTER_COLUMNS = ["item_key", "payload", "error", "attempts", "failed_at"]
+
+
+def is_retryable(error):
+    """Erros de conexão, timeout e respostas 429/5xx; o resto (ex.: modelo inexistente) não melhora repetindo."""
+    if isinstance(error, ollama.ResponseError):
+        return error.status_code in RETRY_STATUS or error.status_code == -1
+    return isinstance(error, (ConnectionError, TimeoutError, httpx.TransportError))
+
+
+class RetryError(Exception):
+    """Desistência após `attempts` tentativas; o erro original fica em `error`."""
+
+    def __init__(self, error, attempts):
+        super().__init__(f"{type(error).__name__}: {error} (após {attempts} tentativa(s))")
+        self.error = error
+        self.attempts = attempts
+
+
+class RetryPolicy:
+    """
+    Repete chamadas que falham por erro passageiro, com backoff exponencial e
+    jitter completo: a espera antes da tentativa n é sorteada entre 0 e
+    min(max_delay, base_delay * 2**(n-1)), o que espalha as threads em vez de
+    reenviar tudo ao mesmo tempo.
+
+    O circuit breaker fica no OllamaPool: um endpoint que falha sai do pool e
+    só volta depois de um probe bem-sucedido, e com todos fora do ar as
+    requisições esperam o probe em vez de falhar. Assim uma queda do servidor
+    pausa o run, sem gastar as tentativas das linhas em andamento.
+    """
+
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self.gave_up = 0
+        self._lock = threading.Lock()
+
+    def call(self, fn, *args):
+        """`fn(*args)` com novas tentativas; lança RetryError ao desistir."""
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return fn(*args)
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_attempts:
+                    with self._lock:
+                        self.gave_up += 1
+                    raise RetryError(e, attempt) from e
+                with self._lock:
+                    self.retries += 1
+                time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1))))
+
+    def report(self):
+        if self.retries or self.gave_up:
+            print(f"Retentativas: {self.retries} novas tentativas, {self.gave_up} itens enviados para dead_letter.")
+
+
+def dead_letter_writer(db_path):
+    """
+    Writer da tabela dead_letter no banco de resultados: itens que esgotaram
+    as tentativas, com o erro e o conteúdo necessário para reprocessá-los.
+    Eles não entram em results, então uma nova execução tenta de novo.
+    """
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS dead_letter (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        item_key TEXT, -- text_hash da frase ou pair_id
+        payload TEXT, -- JSON com os campos de entrada
+        error TEXT,
+        attempts INTEGER,
+        failed_at TEXT
+    )
+    """)
+    conn.commit()
+    conn.close()
+    # Um item por commit: são raros e não podem se perder numa queda
+    return ResultWriter(db_path, "dead_letter", DEAD_LETTER_COLUMNS, batch_size=1)
+
+
+def dead_letter_row(item_key, payload, error):
+    attempts = error.attempts if isinstance(error, RetryError) else 1
+    cause = error.error if isinstance(error, RetryError) else error
+    return (str(item_key), json.dumps(payload, ensure_ascii=False), f"{type(cause).__name__}: {cause}", attempts,
+            datetime.now().isoformat(timespec='seconds'))
@@ -0,0 +1,279 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import groupby, islice, product
+
+from tqdm import tqdm
+
+import classificate_pairs
+import classificate_phrases
+from concurrency_control import AdaptiveConcurrency
+from llm_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_MB, open_cache
+from ollama_pool import open_pool
+from result_writer import ResultWriter
+from retry_policy import DEFAULT_MAX_ATTEMPTS, RetryPolicy, dead_letter_row, dead_letter_writer
+from telemetry import submit_timed
+
+MODES = ("single", "pair")
+
+
+class Experiment:
+    """
+    Uma configuração da matriz: (modo, modelo, prompt, dataset), com seu
+    próprio banco de resultados. Sabe listar o trabalho pendente (retomando
+    do que já está no banco) e gravar os resultados na tabela do seu modo.
+    """
+
+    def __init__(self, mode, model, prompt_path, dataset_path, db_path):
+        self.mode = mode
+        self.model = model
+        self.prompt_path = prompt_path
+        self.dataset_path = dataset_path
+        self.db_path = db_path
+        self.prompt_template = None
+        self.classifier = None
+        self.writer = None
+        self.dead_letters = None
+        self.cache = None
+        self.structured = False
+        self.stream_abort = False
+        self.score = False
+        self.client = None
+
+    @property
+    def name(self):
+        return os.path.splitext(os.path.basename(self.db_path))[0]
+
+    def open(self, cache, structured, stream_abort, commit_every, commit_interval, batch_size, client=None,
+             score=False):
+        """Prepara banco, writer e classificador; devolve (total pendente, iterador de tarefas)."""
+        self.prompt_template = classificate_pairs.read_prompt(self.prompt_path)
+        self.cache = cache
+        self.client = client
+        self.structured = structured
+        self.stream_abort = stream_abort
+        self.score = score
+        self.dead_letters = dead_letter_writer(self.db_path)
+
+        if self.mode == "single":
+            classificate_phrases.setup_database(self.db_path)
+            self.classifier = classificate_phrases.PhraseClassifier(
+                self.prompt_template, cache, structured=structured, stream_abort=stream_abort, model=self.model,
+                client=client, score=score
+            )
+            pending = sum(1 for _ in classificate_phrases.iter_new_rows(self.dataset_path, self.db_path))
+            self.writer = ResultWriter(
+                self.db_path, "results",
+                classificate_phrases.RESULT_COLUMNS,
+                batch_size=commit_every, flush_interval=commit_interval, ignore_duplicates=True
+            )
+            rows = classificate_phrases.iter_new_rows(self.dataset_path, self.db_path)
+            tasks = iter(lambda: list(islice(rows, batch_size)), [])
+            return pending, tasks
+
+        classificate_pairs.setup_database(self.db_path)
+        _, pairs = classificate_pairs.load_pairs_to_process(self.dataset_path, self.db_path)
+        self.writer = ResultWriter(
+            self.db_path, "results_pairs",
+            classificate_pairs.PAIR_COLUMNS,
+            batch_size=commit_every, flush_interval=commit_interval
+        )
+        return len(pairs), ([pair] for pair in pairs)
+
+    def run_task(self, task):
+        """
+        Executa uma tarefa (lote de linhas ou um par) e devolve uma função que,
+        dado o tempo de fila, monta as linhas a gravar.
+        """
+        if self.mode == "single":
+            results = self.classifier.classify_batch([text for text, _, _ in task])
+            return lambda queue_wait_ms: [
+                classificate_phrases.result_row(row, result, queue_wait_ms)
+                for row, result in zip(task, results)
+            ]
+
+        pair_id, gold_pun, gold_non = task[0]
+        row, telemetry = classificate_pairs.classify_pair(
+            pair_id, gold_pun, gold_non, self.prompt_template, self.cache,
+            self.structured, stream_abort=self.stream_abort, model=self.model, client=self.client, score=self.score
+        )
+        return lambda queue_wait_ms: [classificate_pairs.pair_result_row(row, telemetry, queue_wait_ms)]
+
+    def dead_letter(self, task, error):
+        """Grava em dead_letter os itens de uma tarefa que esgotou as tentativas."""
+        if self.mode == "single":
+            for text, label, hash_ in task:
+                self.dead_letters.write(dead_letter_row(hash_, {"text": text, "label": label}, error))
+        else:
+            pair_id, gold_pun, gold_non = task[0]
+            self.dead_letters.write(dead_letter_row(pair_id, {"pun": gold_pun, "non": gold_non}, error))
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+        if self.dead_letters:
+            self.dead_letters.close()
+
+
+def expand_spec(spec, output_dir):
+    """
+    Expande a especificação em experimentos. `spec` é uma lista de blocos
+    {"prompts": [...], "datasets": [...], "models": [...], "modes": [...]}
+    (ou um único bloco); cada bloco vira o produto cartesiano das listas.
+    """
+    blocks = spec if isinstance(spec, list) else [spec]
+    experiments = []
+    seen = set()
+
+    for block in blocks:
+        for mode, model, prompt, dataset in product(
+            block.get("modes", ["single"]), block.get("models", [classificate_phrases.MODEL_NAME]),
+            block["prompts"], block["datasets"]
+        ):
+            if mode not in MODES:
+                raise ValueError(f"Modo desconhecido: {mode!r} (use {', '.join(MODES)})")
+            name = "_".join([
+                mode, model.replace(":", "-").replace("/", "-"),
+                os.path.splitext(os.path.basename(prompt))[0],
+                os.path.splitext(os.path.basename(dataset))[0]
+            ])
+            if name in seen:
+                continue
+            seen.add(name)
+            experiments.append(Experiment(mode, model, prompt, dataset, os.path.join(output_dir, f"{name}.db")))
+
+    # Agrupar por modelo evita que o servidor troque de modelo entre tarefas
+    experiments.sort(key=lambda e: (e.model, e.mode, e.prompt_path, e.dataset_path))
+    return experiments
+
+
+def run_experiments(experiments, concurrency=1, cache_path=DEFAULT_CACHE_PATH, cache_max_mb=DEFAULT_MAX_MB,
+                    structured=False, stream_abort=False, commit_every=50, commit_interval=5.0, batch_size=1,
+                    ollama_hosts=None, adaptive=False, max_concurrency=16, concurrency_log=None,
+                    max_attempts=DEFAULT_MAX_ATTEMPTS, score=False):
+    """
+    Executa todos os experimentos num único pool de `concurrency` threads.
+    Dentro do mesmo modelo as tarefas de configs diferentes se sobrepõem (o
+    fim de uma config já divide o pool com o começo da próxima); na troca de
+    modelo o pool é esvaziado antes, para o Ollama carregar cada modelo uma
+    única vez. As requisições são distribuídas entre os `ollama_hosts`.
+    Com `adaptive`, o tamanho da janela é ajustado pela latência observada
+    (ver AdaptiveConcurrency); a linha de base de latência é refeita a cada
+    modelo, já que muda com ele.
+    Erros passageiros são repetidos (ver RetryPolicy); tarefas que continuam
+    falhando vão para a tabela dead_letter do banco da sua configuração.
+    Com `score`, todas as configs usam o modo de pontuação (um token por
+    requisição, com a confiança gravada em `confidence`).
+    """
+    cache = open_cache(cache_path, cache_max_mb)
+    pool = open_pool(ollama_hosts)
+    controller = AdaptiveConcurrency(concurrency, 1, max_concurrency, concurrency_log) if adaptive else None
+    workers = controller.max_limit if controller else concurrency
+    policy = RetryPolicy(max_attempts)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for model, group in groupby(experiments, key=lambda e: e.model):
+            group = list(group)
+            print(f"--- Modelo '{model}': {len(group)} configurações ---")
+
+            prepared = []
+            for experiment in group:
+                pending_count, tasks = experiment.open(
+                    cache, structured, stream_abort, commit_every, commit_interval, batch_size, pool, score
+                )
+                print(f"  {experiment.name}: {pending_count} itens pendentes")
+                prepared.append((experiment, pending_count, tasks))
+
+            if controller:
+                controller.reset_baseline()
+            progress = tqdm(total=sum(count for _, count, _ in prepared))
+            work = ((experiment, task) for experiment, _, tasks in prepared for task in tasks)
+            pending = {}
+
+            while True:
+                while len(pending) < (controller.limit if controller else concurrency):
+                    item = next(work, None)
+                    if item is None:
+                        break
+                    experiment, task = item
+                    pending[submit_timed(executor, policy.call, experiment.run_task, task)] = (
+                        experiment, task, time.monotonic()
+                    )
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    experiment, task, submitted_at = pending.pop(future)
+                    try:
+                        queue_wait_ms, build_rows = future.result()
+                    except Exception as e:
+                        if controller:
+                            controller.record(time.monotonic() - submitted_at, error=True)
+                        print(f"\nERRO em {experiment.name}, enviado para dead_letter: {e}")
+                        experiment.dead_letter(task, e)
+                        progress.update(len(task))
+                        continue
+                    if controller:
+                        controller.record(time.monotonic() - submitted_at)
+                        progress.set_postfix(concorrencia=controller.limit, refresh=False)
+                    for row in build_rows(queue_wait_ms):
+                        experiment.writer.write(row)
+                    progress.update(len(task))
+
+            progress.close()
+            for experiment in group:
+                experiment.close()
+
+    if controller:
+        controller.report()
+        controller.close()
+    policy.report()
+    pool.report()
+    if cache:
+        cache.report()
+        cache.close()
+    print("Todas as configurações foram processadas.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executa uma matriz de configurações (prompts × datasets × modelos × modos) num único processo.")
+
+    parser.add_argument("spec_file", help="JSON com a matriz de experimentos (ver README)")
+    parser.add_argument("output_dir", help="Diretório onde cada configuração grava seu próprio .db")
+    parser.add_argument("--concurrency", type=int, default=1, help="Requisições simultâneas ao Ollama, somando todas as configs (padrão: 1)")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS, help=f"Tentativas por tarefa antes de mandá-la para dead_letter (padrão: {DEFAULT_MAX_ATTEMPTS})")
+    parser.add_argument("--adaptive", action="store_true", help="Ajusta o número de requisições simultâneas pela latência observada (AIMD), começando em --concurrency")
+    parser.add_argument("--max-concurrency", type=int, default=16, help="Limite superior do modo --adaptive (padrão: 16)")
+    parser.add_argument("--concurrency-log", help="CSV onde o modo --adaptive registra o limite escolhido ao longo do tempo")
+    parser.add_argument("--ollama-host", action="append", help="Endpoint do Ollama (repetível ou separado por vírgulas); as requisições vão para o menos carregado (padrão: OLLAMA_HOST)")
+    parser.add_argument("--batch-size", type=int, default=1, help="Frases por requisição no modo single (padrão: 1)")
+    parser.add_argument("--structured", action="store_true", help="Usa saída JSON restrita por esquema")
+    parser.add_argument("--stream-abort", action="store_true", help="Cancela cada geração assim que o rótulo estiver decidido")
+    parser.add_argument("--score", action="store_true", help="Modo de pontuação: um token por requisição, com a confiança do rótulo")
+    parser.add_argument("--commit-every", type=int, default=50, help="Linhas por transação no SQLite (padrão: 50)")
+    parser.add_argument("--commit-interval", type=float, default=5.0, help="Segundos máximos entre commits (padrão: 5)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help=f"Banco do cache de respostas (padrão: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--no-cache", action="store_true", help="Não consulta nem grava o cache de respostas")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_MAX_MB, help=f"Tamanho máximo do cache em MB (padrão: {DEFAULT_MAX_MB})")
+    parser.add_argument("--dry-run", action="store_true", help="Só lista as configurações, na ordem de execução")
+
+    args = parser.parse_args()
+
+    with open(args.spec_file, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+    experiments = expand_spec(spec, args.output_dir)
+
+    if args.dry_run:
+        for experiment in experiments:
+            print(f"{experiment.model}\t{experiment.mode}\t{experiment.prompt_path}\t{experiment.dataset_path}\t{experiment.db_path}")
+    else:
+        os.makedirs(args.output_dir, exist_ok=True)
+        run_experiments(experiments, max(1, args.concurrency), None if args.no_cache else args.cache,
+                        args.cache_max_mb, args.structured, args.stream_abort,
+                        args.commit_every, args.commit_interval, max(1, args.batch_size), args.ollama_host,
+                        args.adaptive, max(1, args.max_concurrency), args.concurrency_log, args.max_attempts,
+                        args.score)
@@ -0,0 +1,55 @@
+import ollama
+
+def chunk_text(chunk):
+    """Texto de um pedaço do stream, seja de /api/generate ou de /api/chat."""
+    if chunk.get('response') is not None:
+        return chunk['response']
+    message = chunk.get('message')
+    return (message.get('content') if message else None) or ""
+
+def generate_until_decided(generate_fn, is_decided, **request):
+    """
+    Chama `generate_fn(**request)` em modo stream e acumula o texto até que
+    `is_decided(texto_acumulado)` seja verdadeiro. Nesse momento o stream é
+    fechado, o que encerra a conexão e faz o Ollama parar de gerar.
+
+    Devolve um dict no formato de uma resposta não-stream (chave 'response'
+    ou 'message', conforme o endpoint), com as métricas do último pedaço
+    recebido e 'early_stop' indicando se a geração foi interrompida.
+    """
+    stream = generate_fn(**{**request, "stream": True})
+    parts = []
+    last = {}
+    early_stop = False
+
+    try:
+        for chunk in stream:
+            parts.append(chunk_text(chunk))
+            last = chunk
+            if not chunk.get('done') and is_decided("".join(parts)):
+                early_stop = True
+                break
+    finally:
+        close = getattr(stream, 'close', None)
+        if close:
+            close()
+
+    result = last.model_dump() if hasattr(last, 'model_dump') else dict(last)
+    text = "".join(parts)
+    if 'messages' in request:
+        result['message'] = {"role": "assistant", "content": text}
+        result.pop('response', None)
+    else:
+        result['response'] = text
+    result['early_stop'] = early_stop
+    if early_stop and result.get('eval_count') is None:
+        # Sem o pedaço final não há métricas; cada pedaço do stream é um token
+        result['eval_count'] = len(parts)
+    return result
+
+def stream_generate(is_decided, cache=None, generate_fn=ollama.generate, **request):
+    """generate_until_decided passando pelo cache de respostas, se houver."""
+    request = {**request, "stream": True}
+    if cache:
+        return cache.generate(lambda **r: generate_until_decided(generate_fn, is_decided, **r), **request)
+    return generate_until_decided(generate_fn, is_decided, **request)
@@ -0,0 +1,58 @@
+import time
+
+# Métricas que o Ollama devolve em cada resposta (durações em nanossegundos)
+OLLAMA_METRICS = [
+    "total_duration",
+    "load_duration",
+    "prompt_eval_count",
+    "prompt_eval_duration",
+    "eval_count",
+    "eval_duration"
+]
+
+# Colunas de telemetria gravadas junto de cada resultado. wall_time_ms e
+# queue_wait_ms são medidos no cliente; rows_in_request é o número de linhas
+# que dividiram a mesma requisição (modo em lote).
+TELEMETRY_COLUMNS = OLLAMA_METRICS + ["wall_time_ms", "queue_wait_ms", "cache_hit", "rows_in_request"]
+
+_COLUMN_TYPES = {"wall_time_ms": "REAL", "queue_wait_ms": "REAL"}
+
+
+def ensure_telemetry_columns(conn, table):
+    """Adiciona as colunas de telemetria que faltarem em `table` (bancos antigos)."""
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for column in TELEMETRY_COLUMNS:
+        if column not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {_COLUMN_TYPES.get(column, 'INTEGER')}")
+    conn.commit()
+
+
+def response_telemetry(response, wall_time_s, rows_in_request=1):
+    """Monta o dict de telemetria de uma resposta do Ollama (ou do cache)."""
+    telemetry = {metric: response.get(metric) for metric in OLLAMA_METRICS}
+    telemetry["wall_time_ms"] = wall_time_s * 1000
+    telemetry["cache_hit"] = 1 if response.get("cache_hit") else 0
+    telemetry["rows_in_request"] = rows_in_request
+    return telemetry
+
+
+def telemetry_values(telemetry, queue_wait_ms=None):
+    """Valores na ordem de TELEMETRY_COLUMNS, prontos para o INSERT."""
+    telemetry = telemetry or {}
+    return tuple(
+        queue_wait_ms if column == "queue_wait_ms" else telemetry.get(column)
+        for column in TELEMETRY_COLUMNS
+    )
+
+
+def timed_call(submitted_at, fn, *args):
+    """
+    Executa `fn(*args)` numa thread do pool e devolve (queue_wait_ms, resultado),
+    onde queue_wait_ms é o tempo entre o submit e o início da execução.
+    """
+    queue_wait_ms = (time.monotonic() - submitted_at) * 1000
+    return queue_wait_ms, fn(*args)
+
+
+def submit_timed(executor, fn, *args):
+    return executor.submit(timed_call, time.monotonic(), fn, *args)
@@ -0,0 +1,125 @@
+import sqlite3
+import pandas as pd
+import numpy as np
+import os
+import argparse
+
+from telemetry import TELEMETRY_COLUMNS
+
+NS_PER_MS = 1_000_000
+
+def weighted_percentile(values, weights, q):
+    """
+    Percentile where each row counts as `weight` requests. Rows of a batch
+    request share the same timings, so each one weighs 1/rows_in_request and
+    the request as a whole counts once.
+    """
+    order = np.argsort(values)
+    values = np.asarray(values)[order]
+    cumulative = np.cumsum(np.asarray(weights)[order])
+    return values[np.searchsorted(cumulative, q / 100 * cumulative[-1])]
+
+def load_telemetry(db_path):
+    """Reads the telemetry columns from the results table of a database."""
+    conn = sqlite3.connect(db_path)
+    try:
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table';")]
+        table_name = next((t for t in ("results", "results_pairs") if t in tables), None)
+        if table_name is None:
+            return None, None
+
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")}
+        missing = [c for c in TELEMETRY_COLUMNS if c not in existing]
+        if missing:
+            print(f"Warning: '{db_path}' has no telemetry columns (created before telemetry was recorded).")
+            return table_name, None
+
+        df = pd.read_sql_query(f"SELECT {', '.join(TELEMETRY_COLUMNS)} FROM {table_name}", conn)
+        return table_name, df
+    finally:
+        conn.close()
+
+def summarize(df):
+    """Aggregates one config. Cache hits are excluded: their timings belong to the original run."""
+    total_rows = len(df)
+    df = df[(df['cache_hit'] != 1) & df['wall_time_ms'].notna()]
+    cache_hits = total_rows - len(df)
+    if df.empty:
+        return {'Rows': total_rows, 'Cache Hits': cache_hits}
+
+    # Batch rows repeat the metrics of the shared request; weight them back to one request
+    weight = 1 / df['rows_in_request'].fillna(1).clip(lower=1)
+    requests = weight.sum()
+
+    def total(column):
+        return (df[column].fillna(0) * weight).sum()
+
+    eval_tokens = total('eval_count')
+    eval_ms = total('eval_duration') / NS_PER_MS
+    prompt_tokens = total('prompt_eval_count')
+    prompt_ms = total('prompt_eval_duration') / NS_PER_MS
+    load_ms = total('load_duration') / NS_PER_MS
+    server_ms = total('total_duration') / NS_PER_MS
+    wall = df['wall_time_ms']
+    queue = df['queue_wait_ms'].dropna()
+
+    return {
+        'Rows': total_rows,
+        'Cache Hits': cache_hits,
+        'Requests': round(requests),
+        'Rows per Request': (len(df) / requests),
+        'Generation Tokens/s': eval_tokens / (eval_ms / 1000) if eval_ms else np.nan,
+        'Prompt Tokens/s': prompt_tokens / (prompt_ms / 1000) if prompt_ms else np.nan,
+        'Mean Prompt Tokens': prompt_tokens / requests,
+        'Mean Generated Tokens': eval_tokens / requests,
+        'Latency p50 (ms)': weighted_percentile(wall, weight, 50),
+        'Latency p95 (ms)': weighted_percentile(wall, weight, 95),
+        'Latency p99 (ms)': weighted_percentile(wall, weight, 99),
+        'Prompt Time (%)': 100 * prompt_ms / server_ms if server_ms else np.nan,
+        'Generation Time (%)': 100 * eval_ms / server_ms if server_ms else np.nan,
+        'Load Time (%)': 100 * load_ms / server_ms if server_ms else np.nan,
+        'Client Overhead (ms/request)': (total('wall_time_ms') - server_ms) / requests if server_ms else np.nan,
+        'Queue Wait p50 (ms)': queue.median() if not queue.empty else np.nan,
+        'Queue Wait p95 (ms)': queue.quantile(0.95) if not queue.empty else np.nan,
+    }
+
+def telemetry_report(db_paths, output_csv=None):
+    rows = []
+    for db_path in db_paths:
+        if not os.path.exists(db_path):
+            print(f"Error: Database file '{db_path}' not found.")
+            continue
+
+        table_name, df = load_telemetry(db_path)
+        if table_name is None:
+            print(f"Error: No results table found in '{db_path}'.")
+            continue
+        if df is None:
+            continue
+
+        summary = summarize(df)
+        if 'Requests' not in summary:
+            print(f"Warning: '{db_path}' has no timed requests (all rows are cache hits or predate telemetry).")
+        rows.append({'Config': os.path.splitext(os.path.basename(db_path))[0], 'Table': table_name, **summary})
+
+    if not rows:
+        print("Error: No telemetry to report.")
+        return
+
+    report = pd.DataFrame(rows).set_index('Config')
+    with pd.option_context('display.max_columns', None, 'display.width', 200, 'display.float_format', '{:.1f}'.format):
+        print(report.T)
+
+    if output_csv:
+        report.to_csv(output_csv)
+        print(f"Report saved to: {output_csv}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize per-request inference telemetry (tokens/s, latency percentiles, prompt vs generation time) for one or more result databases.")
+
+    parser.add_argument("db_files", nargs="+", help="SQLite .db files written by the classification scripts (one config each)")
+    parser.add_argument("--output", help="Path to save the report as CSV (optional)", default=None)
+
+    args = parser.parse_args()
+
+    telemetry_report(args.db_files, args.output)
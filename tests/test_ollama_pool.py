@@ -0,0 +1,154 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import ollama_pool
+from ollama_pool import OllamaPool
+
+
+class StubOllama:
+    """
+    Servidor HTTP local que imita o Ollama: /api/generate responde depois de
+    `delay` segundos (ou com 500 se `broken`) e /api/tags responde ao probe
+    (200, ou 500 se `broken`). Conta as requisições por caminho.
+    """
+
+    def __init__(self, delay=0.0, broken=False):
+        self.delay = delay
+        self.broken = broken
+        self.hits = {"/api/generate": 0, "/api/tags": 0}
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, code, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _count(self):
+                with stub._lock:
+                    stub.hits[self.path] = stub.hits.get(self.path, 0) + 1
+
+            def do_GET(self):
+                self._count()
+                if stub.broken:
+                    self._reply(500, {"error": "fora do ar"})
+                else:
+                    self._reply(200, {"models": []})
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                self._count()
+                if stub.broken:
+                    self._reply(500, {"error": "fora do ar"})
+                    return
+                time.sleep(stub.delay)
+                self._reply(200, {"model": "llama3", "response": "ok", "done": True})
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.host = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stubs():
+    started = []
+
+    def start(**kwargs):
+        stub = StubOllama(**kwargs)
+        started.append(stub)
+        return stub
+
+    yield start
+    for stub in started:
+        stub.close()
+
+
+def generate(pool):
+    return pool.generate(model="llama3", prompt="Isto é um trocadilho?", stream=False)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condição não atingida a tempo"
+        time.sleep(0.01)
+
+
+def test_request_goes_to_least_loaded_endpoint(stubs):
+    slow, fast = stubs(delay=0.5), stubs()
+    pool = OllamaPool([slow.host, fast.host])
+
+    # Sem latência medida o empate vai para o primeiro; enquanto ele está ocupado, o outro custa menos
+    busy = threading.Thread(target=generate, args=(pool,))
+    busy.start()
+    wait_for(lambda: slow.hits["/api/generate"] == 1)
+    generate(pool)
+    busy.join()
+
+    assert slow.hits["/api/generate"] == 1
+    assert fast.hits["/api/generate"] == 1
+
+    # Com as latências medidas, as requisições seguintes vão para o endpoint rápido
+    for _ in range(3):
+        generate(pool)
+    assert slow.hits["/api/generate"] == 1
+    assert fast.hits["/api/generate"] == 4
+
+
+def test_endpoint_is_ejected_after_consecutive_failures(stubs):
+    broken, healthy = stubs(broken=True), stubs()
+    pool = OllamaPool([broken.host, healthy.host], eject_seconds=60)
+
+    # Cada requisição que falha no endpoint quebrado é repetida no saudável
+    for _ in range(ollama_pool.EJECT_AFTER_FAILURES):
+        assert generate(pool)["response"] == "ok"
+    endpoint = pool.endpoints[0]
+    assert endpoint.ejections == 1
+    assert endpoint.ejected_until is not None
+
+    for _ in range(3):
+        generate(pool)
+    assert broken.hits["/api/generate"] == ollama_pool.EJECT_AFTER_FAILURES
+    assert healthy.hits["/api/generate"] == ollama_pool.EJECT_AFTER_FAILURES + 3
+
+
+def test_ejected_endpoint_returns_after_successful_probe(stubs):
+    flaky, healthy = stubs(broken=True), stubs()
+    pool = OllamaPool([flaky.host, healthy.host], eject_seconds=0.2)
+    for _ in range(ollama_pool.EJECT_AFTER_FAILURES):
+        generate(pool)
+    endpoint = pool.endpoints[0]
+    assert endpoint.ejected_until is not None
+
+    # Probe falho: continua fora do pool, por mais tempo
+    time.sleep(0.25)
+    generate(pool)
+    assert flaky.hits["/api/tags"] == 1
+    assert endpoint.ejected_until is not None
+
+    flaky.broken = False
+    wait_for(lambda: endpoint.ejected_until <= time.monotonic())
+    generate(pool)
+    assert flaky.hits["/api/tags"] == 2
+    assert endpoint.ejected_until is None
+    assert endpoint.consecutive_failures == 0
+
+    # De volta ao pool, o endpoint torna a receber requisições
+    for _ in range(3):
+        generate(pool)
+    assert flaky.hits["/api/generate"] > ollama_pool.EJECT_AFTER_FAILURES
@@ -0,0 +1,79 @@
+import sqlite3
+
+import pandas as pd
+
+from pairs_from_phrases import derive_pair_verdicts, load_phrase_verdicts
+from text_keys import text_hash
+
+# Esquema de results do classificate_phrases.py original, sem text_hash nem confidence
+BASELINE_SCHEMA = """
+CREATE TABLE results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    original_text TEXT UNIQUE,
+    correct_label TEXT,
+    model_input_prompt TEXT,
+    model_response_raw TEXT,
+    extracted_text TEXT,
+    extracted_label TEXT
+)
+"""
+
+PHRASES = [
+    ("Você ensina, e o aluno nada.", "Trocadilho", "Trocadilho"),
+    ("Você ensina, e o aluno não aprende.", "Não trocadilho", "Não trocadilho"),
+    ("O pato perde a pata e fica viúvo.", "Trocadilho", "Trocadilho"),
+    ("O pato perde a pata e fica manco.", "Não trocadilho", "Trocadilho"),
+]
+
+
+def baseline_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute(BASELINE_SCHEMA)
+    conn.execute("CREATE INDEX idx_original_text ON results (original_text)")
+    conn.executemany(
+        "INSERT INTO results (original_text, correct_label, model_input_prompt, model_response_raw, "
+        "extracted_text, extracted_label) VALUES (?, ?, '', '', ?, ?)",
+        [(text, gold, text, label) for text, gold, label in PHRASES]
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+def columns(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {row[1] for row in conn.execute("PRAGMA table_info(results)")}
+    finally:
+        conn.close()
+
+
+def test_load_phrase_verdicts_baseline_schema(tmp_path):
+    db = baseline_db(str(tmp_path / "baseline.db"))
+
+    verdicts = load_phrase_verdicts(db, [PHRASES[0][0], PHRASES[1][0], "Frase fora do banco."])
+
+    assert sorted(verdicts.index) == sorted([text_hash(PHRASES[0][0]), text_hash(PHRASES[1][0])])
+    assert verdicts.loc[text_hash(PHRASES[0][0]), "code"] == 1
+    assert verdicts.loc[text_hash(PHRASES[1][0]), "code"] == 0
+    assert verdicts["confidence"].isna().all()
+    # A consulta é só de leitura: o banco antigo não ganha colunas
+    assert "text_hash" not in columns(db)
+
+
+def test_derive_pair_verdicts_baseline_schema(tmp_path):
+    db = baseline_db(str(tmp_path / "baseline.db"))
+    pairs = pd.DataFrame(
+        {"pun": [PHRASES[0][0], PHRASES[2][0], "Sem .H no banco."],
+         "non": [PHRASES[1][0], PHRASES[3][0], PHRASES[1][0]]},
+        index=pd.Index(["1.1", "1.3", "9.9"], name="base_id")
+    )
+
+    verdicts, pending = derive_pair_verdicts(pairs, db)
+
+    assert list(pending) == ["9.9"]
+    assert verdicts.loc["1.1", "is_correct"] == 1
+    assert verdicts.loc["1.1", "predicted_pun_phrase"] == PHRASES[0][0]
+    # As duas frases foram classificadas como trocadilho, sem confiança: empate
+    assert verdicts.loc["1.3", "error_flag"] == 1
+    assert verdicts.loc["1.3", "is_correct"] == 0
@@ -0,0 +1,46 @@
+import json
+
+import numpy as np
+import pytest
+
+from utils.token_store import build_token_store, iter_json_array, TokenStore
+
+DOCUMENTS = [
+    {"id": "0", "text": [], "labels": []},
+    {"id": "1", "text": ["O", "aluno", "nada", "."], "labels": [0, 0, 1, 0]},
+    {"id": "2", "text": ["Nada", "."], "labels": [1, 0], "extra": 7},
+]
+
+
+def write_json(path, documents):
+    path.write_text(json.dumps(documents, ensure_ascii=False, indent=4), encoding="utf-8")
+    return str(path)
+
+
+def test_iter_json_array_small_reads(tmp_path):
+    path = write_json(tmp_path / "docs.json", DOCUMENTS + [1, 2.5e3, -0.5e-2, None])
+    assert list(iter_json_array(path, read_size=3)) == DOCUMENTS + [1, 2.5e3, -0.5e-2, None]
+
+
+def test_kind_comes_from_first_non_empty_value(tmp_path):
+    source = write_json(tmp_path / "docs.json", DOCUMENTS)
+    build_token_store(source, str(tmp_path / "store"))
+    store = TokenStore(str(tmp_path / "store"))
+
+    assert store.kinds["text"] == "tokens"
+    assert store.kinds["labels"] == "labels"
+    assert store.kinds["extra"] == "int"
+    assert np.issubdtype(store.values("labels").dtype, np.integer)
+    for i, document in enumerate(DOCUMENTS):
+        assert store.string(i, "id") == document["id"]
+        assert store.tokens(i, "text") == document["text"]
+        assert list(store.codes(i, "labels")) == document["labels"]
+        assert int(store.codes(i, "extra")[0]) == document.get("extra", 0)
+    # Os labels não passam pelo vocabulário dos tokens
+    assert store.vocab == ["O", "aluno", "nada", ".", "Nada"]
+
+
+def test_conflicting_kind_is_an_error(tmp_path):
+    source = write_json(tmp_path / "docs.json", [{"labels": [1, 0]}, {"labels": ["a"]}])
+    with pytest.raises(ValueError, match="labels"):
+        build_token_store(source, str(tmp_path / "store"))
@@ -0,0 +1,14 @@
+import hashlib
+
+def text_hash(text):
+    """
+    Chave compacta de um texto: os 8 primeiros bytes do SHA-1 como inteiro
+    com sinal de 64 bits, que cabe numa coluna INTEGER do SQLite. Usada para
+    checar se uma frase já foi processada sem carregar os textos na memória.
+    """
+    digest = hashlib.sha1(str(text).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
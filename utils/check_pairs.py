@@ -1,5 +1,6 @@
 import sys
-import pandas as pd
+
+from pair_index import load_pair_index
 
 def validate_pairs(csv_file_path):
     """
@@ -7,49 +8,27 @@ def validate_pairs(csv_file_path):
     tenha um sufixo '.H' e um sufixo '.N' correspondentes.
     """
     try:
-        df = pd.read_csv(csv_file_path)
+        index = load_pair_index(csv_file_path, use_cache=False)
     except FileNotFoundError:
         print(f"ERRO: Arquivo não encontrado: {csv_file_path}")
         return
+    except ValueError as e:
+        print(f"ERRO: {e}")
+        return
     except Exception as e:
         print(f"ERRO ao ler CSV: {e}")
         return
 
-    if 'id' not in df.columns:
-        print("ERRO: Coluna 'id' não encontrada no CSV.")
-        return
-
-    all_ids = set(df['id'])
-
-
-    orphaned_h = []
-    orphaned_n = []
-    unrecognized = [] 
-
-    for current_id in all_ids:
-        
-        if isinstance(current_id, str) and current_id.endswith('.H'):
-            base_id = current_id[:-2]
-            pair_id = base_id + '.N'
-            
-            if pair_id not in all_ids:
-                orphaned_h.append(current_id)
-                
-        elif isinstance(current_id, str) and current_id.endswith('.N'):
-            base_id = current_id[:-2]
-            pair_id = base_id + '.H'
-            
-            if pair_id not in all_ids:
-                orphaned_n.append(current_id)
-        
-        elif not isinstance(current_id, str):
-             unrecognized.append(f"ID não-string: {current_id}")
-        else:
-            unrecognized.append(f"ID com formato inválido: {current_id}")
+    orphaned_h = index.orphan_h
+    orphaned_n = index.orphan_n
+    unrecognized = [
+        f"ID com formato inválido: {current_id}" if isinstance(current_id, str) else f"ID não-string: {current_id}"
+        for current_id in index.unrecognized
+    ]
 
     if not orphaned_h and not orphaned_n and not unrecognized:
-        print(f"Sucesso! Todos os {len(all_ids)} IDs estão pareados corretamente.")
-        print(f"(Total de {len(all_ids) // 2} pares encontrados)")
+        print(f"Sucesso! Todos os {2 * len(index)} IDs estão pareados corretamente.")
+        print(f"(Total de {len(index)} pares encontrados)")
     else:
         print("🚨 Verificação falhou. Encontrados os seguintes problemas:")
         
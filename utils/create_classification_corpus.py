@@ -2,11 +2,10 @@ import json
 from argparse import ArgumentParser
 from pathlib import Path
 
+import numpy as np
 from nltk.tokenize.treebank import TreebankWordDetokenizer
 
-
-def list_to_dict(list_):
-    return {item['id']: item for item in list_}
+from token_store import iter_json_array, load_token_store
 
 
 parser = ArgumentParser()
@@ -18,32 +17,26 @@ parser.add_argument('--editions', '-e',
                     required=True, type=Path)
 
 
-# Read data
+# Read data: the editions come from the memory-mapped token store (built
+# once and cached), and the corpus is streamed one pun at a time
 args = parser.parse_args()
-with args.corpus.open('r', encoding='utf-8') as file_:
-    corpus = json.load(file_)
-editions = list()
-for filepath in args.editions.iterdir():
-    with filepath.open('r', encoding='utf-8') as file_:
-        edited = json.load(file_)
-        editions.append(edited)
-
-# Dictionaries are easier to handle
-corpus_dict = list_to_dict(corpus)
-editions_list = [list_to_dict(e) for e in editions]
-editions_dict = {k: e[k] for e in editions_list for k in e}
+editions = load_token_store(str(args.editions))
 
 
 # Create classification data
 classification_corpus = dict()
-for k in corpus_dict:
-    if editions_dict[k]['tokens'] == editions_dict[k]['edited tokens']:
+twd = TreebankWordDetokenizer()
+for pun in iter_json_array(args.corpus):
+    k = pun['id']
+    i = editions.position(k)
+    # Same vocabulary for both columns, so equal codes mean equal tokens
+    if np.array_equal(editions.codes(i, 'tokens'),
+                      editions.codes(i, 'edited tokens')):
         continue
-    classification_corpus[k + '.H'] = {'text': corpus_dict[k]['text'],
+    classification_corpus[k + '.H'] = {'text': pun['text'],
                                        'label': 1}
     # Detokenize
-    twd = TreebankWordDetokenizer()
-    edited_tokens = [tok for tok in editions_dict[k]['edited tokens']
+    edited_tokens = [tok for tok in editions.tokens(i, 'edited tokens')
                      if tok.strip()]
     detokenized_text = twd.detokenize(edited_tokens)
     classification_corpus[k + '.N'] = {'text': detokenized_text,
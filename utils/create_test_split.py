@@ -2,6 +2,8 @@ import sys
 import pandas as pd
 import random
 
+from pair_index import build_pair_index, split_ids
+
 def create_paired_split(input_csv, train_output_csv, test_output_csv, sample_size=100):
     """
     Cria um conjunto de treino selecionando N pares (H e N)
@@ -15,8 +17,7 @@ def create_paired_split(input_csv, train_output_csv, test_output_csv, sample_siz
             return
 
         df['id'] = df['id'].astype(str)
-        df['base_id'] = df['id'].str[:-2]
-        df['suffix'] = df['id'].str[-2:]
+        df['base_id'], _ = split_ids(df['id'])
 
     except FileNotFoundError:
         print(f"ERRO: Arquivo não encontrado: {input_csv}")
@@ -25,10 +26,8 @@ def create_paired_split(input_csv, train_output_csv, test_output_csv, sample_siz
         print(f"ERRO ao ler CSV: {e}")
         return
 
-    ids_h = set(df[df['suffix'] == '.H']['base_id'])
-    ids_n = set(df[df['suffix'] == '.N']['base_id'])
-    
-    complete_pairs_base_ids = list(ids_h.intersection(ids_n))
+    # Ordenado para a amostra com seed ser a mesma a cada execução
+    complete_pairs_base_ids = sorted(build_pair_index(df).pairs.index)
     
     if len(complete_pairs_base_ids) < sample_size:
         print(f"ERRO: Não há pares suficientes para amostragem.")
@@ -43,8 +42,8 @@ def create_paired_split(input_csv, train_output_csv, test_output_csv, sample_siz
     
     df_test = df[~df['base_id'].isin(selected_base_ids_for_train)]
 
-    df_train = df_train.drop(columns=['base_id', 'suffix'])
-    df_test = df_test.drop(columns=['base_id', 'suffix'])
+    df_train = df_train.drop(columns=['base_id'])
+    df_test = df_test.drop(columns=['base_id'])
 
 
     try:
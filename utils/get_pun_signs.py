@@ -1,54 +1,55 @@
-import sys
+import argparse
 import pandas as pd
 
-def get_pun_signs(file_puns_path, file_texts_path, output_path):
+from sign_matcher import SignMatcher, load_signs
+
+def get_pun_signs(file_puns_path, file_texts_path, output_path, alternatives=False, word_boundary=False,
+                  ignore_accents=False):
     """
     Filtra textos com o label 'Trocadilho' do file_texts_path e procura por 
     cada 'pun sign' do file_puns_path dentro desses textos.
-    Salva os textos filtrados com uma nova coluna 'found_pun_signs' no output_path.
+    Salva os textos filtrados com as novas colunas 'found_pun_signs' e
+    'pun_sign_offsets' ([início, fim, sinal] de cada ocorrência) no output_path.
+
+    Os sinais são procurados todos de uma vez por um SignMatcher (Aho-Corasick),
+    numa única passada por texto.
 
     Args:
-        file_puns_path (str): O caminho para o CSV com os pun signs.
+        file_puns_path (str): O caminho para o CSV (ou o puns.json) com os pun signs.
         file_texts_path (str): O caminho para o CSV com os textos e labels.
         output_path (str): O caminho para o CSV de saída.
+        alternatives (bool): Procura também os 'alternative sign'.
+        word_boundary (bool): Só aceita ocorrências de palavras inteiras.
+        ignore_accents (bool): Ignora acentos na comparação.
     """
     try:
-        df_puns = pd.read_csv(file_puns_path)
-        df_texts = pd.read_csv(file_texts_path)
-
-        if 'pun sign' not in df_puns.columns:
-            print(f"ERRO: Coluna 'pun sign' não encontrada em {file_puns_path}.")
+        try:
+            pun_signs_list = load_signs(file_puns_path, alternatives)
+        except ValueError as e:
+            print(f"ERRO: {e}")
             return
+        df_texts = pd.read_csv(file_texts_path)
         
         required_text_cols = ['text', 'label']
         if not all(col in df_texts.columns for col in required_text_cols):
             print(f"ERRO: Colunas 'text' e/ou 'label' não encontradas em {file_texts_path}.")
             return
 
-        pun_signs_list = [str(pun).lower() for pun in df_puns['pun sign'].dropna().unique()]
-
         df_trocadilhos = df_texts[df_texts['label'] == 'Trocadilho'].copy()
 
         if df_trocadilhos.empty:
             print("Nenhum texto encontrado com o label 'Trocadilho'.")
             df_trocadilhos['found_pun_signs'] = pd.Series(dtype='object')
+            df_trocadilhos['pun_sign_offsets'] = pd.Series(dtype='object')
             df_trocadilhos.to_csv(output_path, index=False)
             print(f"Arquivo de saída vazio '{output_path}' criado.")
             return
 
-        found_puns_col = []
-        
-        for text in df_trocadilhos['text']:
-            found_puns_for_this_text = []
-            text_lower = str(text).lower()
-            
-            for pun_sign in pun_signs_list:
-                if pun_sign in text_lower:
-                    found_puns_for_this_text.append(pun_sign)
-            
-            found_puns_col.append(found_puns_for_this_text)
+        matcher = SignMatcher(pun_signs_list, word_boundary, ignore_accents)
+        matches = [matcher.find(text) for text in df_trocadilhos['text']]
 
-        df_trocadilhos['found_pun_signs'] = found_puns_col
+        df_trocadilhos['found_pun_signs'] = [matcher.found_signs(found) for found in matches]
+        df_trocadilhos['pun_sign_offsets'] = [[list(match) for match in found] for found in matches]
         df_trocadilhos.to_csv(output_path, index=False)
         
         print(f"Textos processados com sucesso e resultados salvos em '{output_path}'")
@@ -61,12 +62,16 @@ def get_pun_signs(file_puns_path, file_texts_path, output_path):
         print(f"Um erro inesperado ocorreu: {e}")
 
 if __name__ == "__main__":
-    if len(sys.argv) < 4:
-        print("Uso: python get_pun_signs.py <file_puns_path> <file_texts_path> <output_csv_path>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Procura os pun signs nos textos com o label 'Trocadilho'.")
+
+    parser.add_argument("file_puns_path", help="CSV com a coluna 'pun sign' (ou originalData/puns.json)")
+    parser.add_argument("file_texts_path", help="CSV com as colunas 'text' e 'label'")
+    parser.add_argument("output_path", help="CSV de saída")
+    parser.add_argument("--alternative-signs", action="store_true", help="Procura também os 'alternative sign'")
+    parser.add_argument("--word-boundary", action="store_true", help="Só aceita ocorrências de palavras inteiras")
+    parser.add_argument("--ignore-accents", action="store_true", help="Ignora acentos na comparação")
+
+    args = parser.parse_args()
 
-    file_a_path = sys.argv[1]
-    file_b_path = sys.argv[2]
-    output_path = sys.argv[3]
-    
-    get_pun_signs(file_a_path, file_b_path, output_path)
\ No newline at end of file
+    get_pun_signs(args.file_puns_path, args.file_texts_path, args.output_path, args.alternative_signs,
+                  args.word_boundary, args.ignore_accents)
@@ -0,0 +1,122 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+# Cache em disco dos índices já montados, invalidado por caminho, tamanho e mtime do CSV
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "pair_index")
+
+
+class PairIndex:
+    """
+    Tabela base_id -> (frase .H, frase .N) de um CSV com ids no formato
+    '<base>.H' / '<base>.N'.
+
+    - `pairs`: DataFrame indexado por base_id, com as colunas 'pun' e 'non',
+      na ordem em que os ids .H aparecem no CSV.
+    - `orphan_h` / `orphan_n`: ids .H sem .N e vice-versa.
+    - `unrecognized`: ids que não terminam em .H ou .N (ou não são texto).
+    - `duplicated`: ids repetidos; vale a primeira ocorrência.
+    """
+
+    def __init__(self, pairs, orphan_h, orphan_n, unrecognized, duplicated):
+        self.pairs = pairs
+        self.orphan_h = orphan_h
+        self.orphan_n = orphan_n
+        self.unrecognized = unrecognized
+        self.duplicated = duplicated
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def is_clean(self):
+        return not (self.orphan_h or self.orphan_n or self.unrecognized or self.duplicated)
+
+    def report(self):
+        """Resumo de uma linha com os problemas encontrados, se houver."""
+        problems = []
+        if self.orphan_h:
+            problems.append(f"{len(self.orphan_h)} '.H' sem '.N'")
+        if self.orphan_n:
+            problems.append(f"{len(self.orphan_n)} '.N' sem '.H'")
+        if self.unrecognized:
+            problems.append(f"{len(self.unrecognized)} ids não reconhecidos")
+        if self.duplicated:
+            problems.append(f"{len(self.duplicated)} ids repetidos")
+        summary = f"{len(self.pairs)} pares completos"
+        return f"{summary} ({', '.join(problems)})" if problems else summary
+
+
+def split_ids(ids):
+    """
+    Separa uma Series de ids em (base_id, sufixo) de forma vetorizada.
+    O sufixo é 'H', 'N' ou '' para ids fora do formato (incluindo não-texto).
+    """
+    # Colunas numéricas (ids sem sufixo) não têm nenhum id reconhecível
+    is_text = ids.notna() if pd.api.types.is_string_dtype(ids) else pd.Series(False, index=ids.index)
+    parts = ids.astype(str).str.rpartition('.')
+    suffix = parts[2].where(is_text & parts[1].eq('.'), '')
+    suffix = suffix.where(suffix.isin(['H', 'N']), '')
+    return parts[0], suffix
+
+
+def build_pair_index(df, text_column='text'):
+    """Monta o PairIndex de um DataFrame com as colunas 'id' e `text_column`, numa única passada."""
+    base_id, suffix = split_ids(df['id'])
+    texts = df[text_column].astype(str)
+
+    duplicated_mask = df['id'].duplicated() & df['id'].notna()
+    keep = ~duplicated_mask
+    is_h = (suffix == 'H') & keep
+    is_n = (suffix == 'N') & keep
+
+    pun = pd.Series(texts[is_h].to_numpy(), index=base_id[is_h].to_numpy(), name='pun')
+    non = pd.Series(texts[is_n].to_numpy(), index=base_id[is_n].to_numpy(), name='non')
+
+    has_non = np.isin(pun.index, non.index)
+    has_pun = np.isin(non.index, pun.index)
+    pairs = pd.DataFrame({'pun': pun[has_non], 'non': non.reindex(pun.index[has_non])})
+    pairs.index.name = 'base_id'
+
+    unrecognized = df['id'][(suffix == '') & keep].tolist()
+    return PairIndex(
+        pairs,
+        [f"{base}.H" for base in pun.index[~has_non]],
+        [f"{base}.N" for base in non.index[~has_pun]],
+        unrecognized,
+        df['id'][duplicated_mask].tolist()
+    )
+
+
+def _cache_path(csv_path, text_column):
+    stat = os.stat(csv_path)
+    key = f"{os.path.abspath(csv_path)}|{stat.st_size}|{stat.st_mtime_ns}|{text_column}"
+    return os.path.join(CACHE_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".pkl")
+
+
+def load_pair_index(csv_path, text_column='text', use_cache=True):
+    """
+    PairIndex de um CSV. Com `use_cache`, o índice fica salvo em cache/pair_index
+    e é reaproveitado enquanto o CSV não mudar (mesmo tamanho e mtime).
+    Erros de leitura do CSV são propagados.
+    """
+    cache_path = _cache_path(csv_path, text_column) if use_cache else None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            return PairIndex(**pd.read_pickle(cache_path))
+        except Exception:
+            pass
+
+    df = pd.read_csv(csv_path, usecols=lambda column: column in ('id', text_column))
+    if 'id' not in df.columns:
+        raise ValueError("Coluna 'id' não encontrada no CSV.")
+    if text_column not in df.columns:
+        df[text_column] = ''
+    index = build_pair_index(df, text_column)
+
+    if cache_path:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Só dados no pickle, para o cache servir tanto a `utils.pair_index` quanto a `pair_index`
+        pd.to_pickle(vars(index), cache_path)
+    return index
@@ -0,0 +1,171 @@
+import ast
+import json
+import os
+import unicodedata
+from functools import lru_cache
+
+import pandas as pd
+
+
+@lru_cache(maxsize=None)
+def fold_char(char, ignore_accents):
+    """Forma normalizada de um caractere: minúscula e, opcionalmente, sem acentos."""
+    folded = char.lower()
+    if ignore_accents:
+        folded = "".join(c for c in unicodedata.normalize("NFD", folded) if not unicodedata.combining(c))
+    return folded
+
+
+def fold_text(text, ignore_accents=False):
+    """
+    (texto normalizado, posições): `posições[i]` é o índice, no texto
+    original, do caractere que gerou o i-ésimo caractere normalizado, ou
+    None quando a normalização mantém um caractere para cada caractere
+    (o caso comum), e os índices são os mesmos.
+    """
+    if not ignore_accents or text.isascii():
+        folded = text.lower()
+    else:
+        folded = text.translate({ord(c): fold_char(c, True) for c in set(text)})
+    if len(folded) == len(text):
+        return folded, None
+
+    pieces, positions = [], []
+    for index, char in enumerate(text):
+        piece = fold_char(char, ignore_accents)
+        pieces.append(piece)
+        positions.extend([index] * len(piece))
+    return "".join(pieces), positions
+
+
+class SignMatcher:
+    """
+    Autômato de Aho-Corasick sobre um conjunto de sinais (palavras ou
+    expressões). Montado uma vez, acha todas as ocorrências de todos os
+    sinais num texto em uma única passada, em tempo linear no tamanho do
+    texto mais o número de ocorrências.
+
+    - `word_boundary`: só aceita ocorrências que não estejam coladas a letras
+      ou dígitos ("nada" não casa em "nadador").
+    - `ignore_accents`: "você" casa com "voce" e vice-versa.
+
+    A comparação ignora maiúsculas sempre. Os offsets devolvidos são sempre
+    os do texto original.
+    """
+
+    def __init__(self, signs, word_boundary=False, ignore_accents=False):
+        self.word_boundary = word_boundary
+        self.ignore_accents = ignore_accents
+        # Sinais únicos na ordem de entrada; sinais iguais após a normalização viram um só
+        self.signs = []
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+        seen = set()
+        for sign in signs:
+            folded = fold_text(str(sign), ignore_accents)[0]
+            if not folded or folded in seen:
+                continue
+            seen.add(folded)
+            self._add(folded, len(self.signs))
+            self.signs.append(str(sign))
+        self._order = {sign: i for i, sign in enumerate(self.signs)}
+        self._build_failure_links()
+
+    def __len__(self):
+        return len(self.signs)
+
+    def _add(self, folded, sign_id):
+        state = 0
+        for char in folded:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        self._out[state].append((sign_id, len(folded)))
+
+    def _build_failure_links(self):
+        # Busca em largura; cada estado herda as saídas do seu estado de falha
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, child in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+                queue.append(child)
+
+    def _is_boundary(self, text, start, end):
+        return (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
+
+    def find(self, text):
+        """
+        Todas as ocorrências em `text`, como [(início, fim, sinal)] ordenadas
+        pelo fim e, no mesmo fim, do sinal mais longo ao mais curto. Sinais
+        sobrepostos são todos devolvidos.
+        """
+        text = str(text)
+        folded, positions = fold_text(text, self.ignore_accents)
+        goto, fail, out = self._goto, self._fail, self._out
+
+        matches = []
+        state = 0
+        for index, char in enumerate(folded):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for sign_id, length in out[state]:
+                start, end = index - length + 1, index + 1
+                if positions is not None:
+                    start, end = positions[start], positions[end - 1] + 1
+                if self.word_boundary and not self._is_boundary(text, start, end):
+                    continue
+                matches.append((start, end, self.signs[sign_id]))
+        return matches
+
+    def found_signs(self, matches):
+        """Sinais distintos de uma lista de ocorrências de find(), na ordem em que o matcher os recebeu."""
+        return sorted({sign for _, _, sign in matches}, key=self._order.__getitem__)
+
+
+def _as_list(value):
+    """Valores da coluna 'alternative sign' do CSV vêm como texto de uma lista Python."""
+    if isinstance(value, list):
+        return value
+    if not isinstance(value, str) or not value.strip():
+        return []
+    try:
+        parsed = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return [value]
+    return parsed if isinstance(parsed, list) else [parsed]
+
+
+def load_signs(path, alternatives=True):
+    """
+    Sinais de trocadilho de originalData/puns.json ou do CSV equivalente
+    (colunas 'pun sign' e 'alternative sign'), sem repetição e em minúsculas.
+    Com `alternatives`, os sinais alternativos entram depois dos principais.
+    """
+    if os.path.splitext(path)[1].lower() == ".json":
+        with open(path, "r", encoding="utf-8") as f:
+            entries = [sign for pun in json.load(f) for sign in pun.get("signs", [])]
+        pun_signs = [entry.get("pun sign") for entry in entries]
+        alternative_signs = [alt for entry in entries for alt in _as_list(entry.get("alternative sign"))]
+    else:
+        df = pd.read_csv(path)
+        if "pun sign" not in df.columns:
+            raise ValueError(f"Coluna 'pun sign' não encontrada em {path}.")
+        pun_signs = df["pun sign"].dropna().tolist()
+        alternative_signs = [alt for value in df.get("alternative sign", pd.Series(dtype=object)).dropna()
+                             for alt in _as_list(value)]
+
+    signs = pun_signs + (alternative_signs if alternatives else [])
+    return list(dict.fromkeys(str(sign).lower() for sign in signs if pd.notna(sign) and str(sign).strip()))
@@ -0,0 +1,321 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from array import array
+
+import numpy as np
+
+# Stores já convertidos, invalidados por caminho, tamanho e mtime dos JSONs de origem
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "token_store")
+
+# Bytes lidos do arquivo por vez pelo iter_json_array
+READ_SIZE = 1 << 16
+
+STORE_VERSION = 2
+
+
+def iter_json_array(path, read_size=READ_SIZE):
+    """
+    Percorre os itens de um arquivo com um array JSON no topo, um por vez,
+    sem carregar o arquivo inteiro: só o item atual e um bloco de leitura
+    ficam em memória.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer, position, eof = "", 0, False
+
+        def fill():
+            nonlocal buffer, position, eof
+            chunk = f.read(read_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+
+        def skip(chars):
+            nonlocal position
+            while True:
+                while position < len(buffer) and buffer[position] in chars:
+                    position += 1
+                if position < len(buffer) or eof:
+                    return
+                fill()
+
+        skip(" \t\r\n")
+        if buffer[position:position + 1] != "[":
+            raise ValueError(f"'{path}' não começa com um array JSON.")
+        position += 1
+
+        while True:
+            skip(" \t\r\n,")
+            if position >= len(buffer):
+                raise ValueError(f"'{path}' terminou antes do fim do array.")
+            if buffer[position] == "]":
+                return
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    fill()
+                    continue
+                # Um número cortado no fim do bloco ("2." de "2.5") também decodifica
+                if not eof and (end == len(buffer) or buffer[end] not in " \t\r\n,]"):
+                    fill()
+                    continue
+                break
+            position = end
+            yield item
+
+
+def source_files(source):
+    """Os JSONs de `source`: o próprio arquivo, ou os .json de um diretório em ordem de nome."""
+    if os.path.isdir(source):
+        return sorted(os.path.join(source, name) for name in os.listdir(source) if name.endswith(".json"))
+    return [source]
+
+
+def _value_kind(value):
+    """Tipo de coluna indicado por um valor, ou None se ele não decide (None ou lista vazia)."""
+    if value is None or (isinstance(value, list) and not value):
+        return None
+    if isinstance(value, list):
+        return "labels" if isinstance(value[0], (int, bool)) else "tokens"
+    return "int" if isinstance(value, (int, bool)) else "str"
+
+
+def _smallest_int(values):
+    values = np.frombuffer(values, dtype=np.int64)
+    if values.size == 0:
+        return values.astype(np.int8)
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if values.min() >= info.min and values.max() <= info.max:
+            return values.astype(dtype)
+    return values
+
+
+def _encode_strings(strings):
+    """Strings como (bytes UTF-8 concatenados, offsets em bytes com n+1 posições)."""
+    data = bytearray()
+    offsets = array("q", [0])
+    for string in strings:
+        data += string.encode("utf-8")
+        offsets.append(len(data))
+    return np.frombuffer(bytes(data), dtype=np.uint8), np.frombuffer(offsets, dtype=np.int64)
+
+
+def build_token_store(source, output_dir):
+    """
+    Converte os registros de `source` (um arquivo com um array JSON ou um
+    diretório deles) num store colunar em `output_dir`, lendo um registro por
+    vez. O tipo de cada campo vem do primeiro valor não vazio dele (um
+    campo ausente, nulo ou com lista vazia não decide o tipo):
+
+    - lista de strings (tokens): códigos int32 num vocabulário comum a todas
+      as colunas de tokens, mais offsets por documento;
+    - lista de inteiros (labels): o menor tipo inteiro que comporta os
+      valores, mais offsets por documento;
+    - string (str): bytes UTF-8 concatenados mais offsets;
+    - inteiro (int): um valor por documento, sem offsets.
+
+    A coluna 'source' guarda o índice do arquivo de origem de cada documento.
+    """
+    files = source_files(source)
+    vocab = {}
+    kinds, values, offsets = {}, {}, {}
+    documents = 0
+
+    def decide(name, kind):
+        # Até aqui a coluna só recebeu valores vazios: nenhum valor a refazer, só offsets
+        kinds[name] = kind
+        values[name] = bytearray() if kind == "str" else array("i" if kind == "tokens" else "q")
+        if kind == "int":
+            values[name].extend([0] * documents)
+            offsets.pop(name, None)
+
+    for file_index, path in enumerate(files):
+        for record in iter_json_array(path):
+            record["source"] = file_index
+            for name in record:
+                if name not in kinds:
+                    # Coluna nova: documentos anteriores ficam vazios nela
+                    kinds[name] = None
+                    offsets[name] = array("q", [0] * (documents + 1))
+
+            for name, kind in kinds.items():
+                value = record.get(name)
+                value_kind = _value_kind(value)
+                if kind is None and value_kind is not None:
+                    decide(name, value_kind)
+                    kind = value_kind
+                elif value_kind is not None and value_kind != kind:
+                    raise ValueError(f"Coluna '{name}' em '{path}': valor do tipo {value_kind}, "
+                                     f"mas a coluna é {kind}.")
+
+                if kind == "str":
+                    values[name] += ("" if value is None else str(value)).encode("utf-8")
+                elif kind == "tokens":
+                    values[name].extend(vocab.setdefault(token, len(vocab)) for token in (value or []))
+                elif kind == "labels":
+                    values[name].extend(int(v) for v in (value or []))
+                elif kind == "int":
+                    values[name].append(int(value or 0))
+                if kind != "int":
+                    offsets[name].append(len(values.get(name, ())))
+            documents += 1
+    if not documents:
+        raise ValueError(f"Nenhum registro em '{source}'.")
+
+    # Colunas só com listas vazias (ou nulos) em todos os documentos ficam como tokens
+    for name, kind in kinds.items():
+        if kind is None:
+            decide(name, "tokens")
+
+    os.makedirs(output_dir, exist_ok=True)
+    for name, kind in kinds.items():
+        if kind == "str":
+            data = np.frombuffer(bytes(values[name]), dtype=np.uint8)
+        elif kind == "tokens":
+            data = np.frombuffer(values[name], dtype=np.int32)
+        else:
+            data = _smallest_int(values[name])
+        np.save(os.path.join(output_dir, f"{_file_name(name)}.values.npy"), data)
+        if name in offsets:
+            np.save(os.path.join(output_dir, f"{_file_name(name)}.offsets.npy"),
+                    np.frombuffer(offsets[name], dtype=np.int64))
+
+    vocab_bytes, vocab_offsets = _encode_strings(vocab)
+    np.save(os.path.join(output_dir, "vocab.values.npy"), vocab_bytes)
+    np.save(os.path.join(output_dir, "vocab.offsets.npy"), vocab_offsets)
+
+    meta = {"version": STORE_VERSION, "documents": documents, "kinds": kinds,
+            "files": [os.path.basename(path) for path in files]}
+    with open(os.path.join(output_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+
+def _file_name(column):
+    # Nomes de campo como 'edited tokens' viram nomes de arquivo sem espaços
+    return column.replace(" ", "_")
+
+
+def _load_array(path):
+    array_ = np.load(path, mmap_mode="r")
+    # Arrays vazios não têm o que mapear; np.asarray devolve uma cópia vazia comum
+    return array_ if array_.size else np.asarray(array_)
+
+
+class TokenStore:
+    """
+    Store colunar montado por build_token_store, com os arrays mapeados em
+    memória (np.load com mmap_mode='r'): abrir não lê os dados, e tokens e
+    labels são fatias de arrays NumPy, sem um objeto Python por token.
+
+    - `kinds`: tipo de cada coluna ('tokens', 'labels', 'str' ou 'int').
+    - `values(column)` / `offsets(column)`: os arrays crus de uma coluna.
+    - `codes(i, column)`: códigos dos tokens do documento i, ou seus labels.
+    - `tokens(i, column)`: os tokens do documento i como strings.
+    - `string(i, column)`: o valor de uma coluna de texto.
+    - `position(id_)`: posição de um documento pelo 'id'.
+    """
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.directory = directory
+        self.kinds = meta["kinds"]
+        self.files = meta["files"]
+        self._documents = meta["documents"]
+        self._arrays = {}
+        self._vocab = None
+        self._positions = None
+
+    def __len__(self):
+        return self._documents
+
+    def _array(self, name, part):
+        key = (name, part)
+        if key not in self._arrays:
+            path = os.path.join(self.directory, f"{_file_name(name)}.{part}.npy")
+            self._arrays[key] = _load_array(path) if os.path.exists(path) else None
+        return self._arrays[key]
+
+    def values(self, column):
+        return self._array(column, "values")
+
+    def offsets(self, column):
+        return self._array(column, "offsets")
+
+    def codes(self, i, column):
+        offsets = self.offsets(column)
+        if offsets is None:
+            return self.values(column)[i:i + 1]
+        return self.values(column)[offsets[i]:offsets[i + 1]]
+
+    @property
+    def vocab(self):
+        """Vocabulário das colunas de tokens, decodificado uma vez (um objeto por tipo, não por token)."""
+        if self._vocab is None:
+            data = self.values("vocab").tobytes()
+            offsets = self.offsets("vocab")
+            self._vocab = [data[offsets[j]:offsets[j + 1]].decode("utf-8") for j in range(len(offsets) - 1)]
+        return self._vocab
+
+    def tokens(self, i, column):
+        vocab = self.vocab
+        return [vocab[code] for code in self.codes(i, column)]
+
+    def string(self, i, column):
+        return bytes(self.codes(i, column)).decode("utf-8")
+
+    def position(self, id_):
+        if self._positions is None:
+            self._positions = {self.string(i, "id"): i for i in range(len(self))}
+        return self._positions[id_]
+
+
+def _cache_dir(source):
+    files = source_files(source)
+    parts = [os.path.abspath(source), str(STORE_VERSION)]
+    for path in files:
+        stat = os.stat(path)
+        parts.append(f"{os.path.basename(path)}|{stat.st_size}|{stat.st_mtime_ns}")
+    return os.path.join(CACHE_DIR, hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest())
+
+
+def load_token_store(source, use_cache=True):
+    """
+    TokenStore de `source` (ex.: originalData/pun_location.json ou o diretório
+    originalData/split_annotation). Com `use_cache`, o store fica em
+    cache/token_store e só é refeito quando algum JSON de origem muda (tamanho
+    ou mtime); sem cache, é montado num diretório temporário dentro do cache.
+    """
+    directory = _cache_dir(source)
+    if not use_cache or not os.path.exists(os.path.join(directory, "meta.json")):
+        # Monta num diretório temporário e renomeia, para nunca deixar um store pela metade
+        building = f"{directory}.{os.getpid()}.tmp"
+        shutil.rmtree(building, ignore_errors=True)
+        build_token_store(source, building)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(building, directory)
+    return TokenStore(directory)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Converte um JSON (ou um diretório de JSONs) de tokens em um store colunar mapeável em memória.")
+
+    parser.add_argument("source", help="Arquivo com um array JSON ou diretório com arquivos .json")
+    parser.add_argument("--rebuild", action="store_true", help="Refaz o store mesmo se o cache estiver atualizado")
+
+    args = parser.parse_args()
+
+    started_at = time.monotonic()
+    store = load_token_store(args.source, use_cache=not args.rebuild)
+    elapsed = time.monotonic() - started_at
+    columns = ", ".join(f"{name} ({kind})" for name, kind in store.kinds.items())
+    print(f"{len(store)} documentos em {elapsed * 1000:.0f} ms: {columns}")
+    print(f"Store em: {store.directory}")
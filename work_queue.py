@@ -0,0 +1,170 @@
+import os
+import socket
+import sqlite3
+import time
+
+# Tempo que uma linha reservada fica com o worker antes de poder ser retomada por outro
+DEFAULT_LEASE_SECONDS = 300.0
+
+# Reservas por linha; uma linha que derrubou ou esgotou tantos workers fica de fora
+MAX_CLAIMS = 3
+
+# Intervalo máximo entre novas tentativas de reserva enquanto outros workers têm leases ativos
+LEASE_POLL_SECONDS = 5.0
+
+# Espera máxima pelo lock do SQLite quando vários workers disputam o banco
+BUSY_TIMEOUT = 30.0
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue:
+    """
+    Fila de trabalho no próprio banco de resultados, para que vários
+    processos dividam o mesmo run sem pagar duas vezes pela mesma inferência.
+
+    A tabela work_queue guarda as linhas do CSV ainda não processadas
+    (chave text_hash). Um worker reserva um bloco de linhas gravando seu id e
+    um prazo (lease) numa transação IMMEDIATE, então dois workers nunca
+    reservam a mesma linha ao mesmo tempo. Uma linha sai da fila quando seu
+    resultado aparece em `results`; se o worker cair antes disso, o lease
+    expira e a linha volta a ser reservável por outro worker.
+    """
+
+    def __init__(self, db_path, worker_id=None, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS work_queue (
+            text_hash INTEGER PRIMARY KEY,
+            original_text TEXT,
+            correct_label TEXT,
+            worker_id TEXT,
+            lease_expires REAL, -- NULL: nunca reservada
+            attempts INTEGER DEFAULT 0
+        )
+        """)
+        self.claimed = 0
+        self.reclaimed = 0
+
+    def enqueue(self, rows, block_size=1000):
+        """
+        Adiciona (texto, label, text_hash) à fila; linhas já enfileiradas são
+        ignoradas, então todos os workers podem chamar com o mesmo CSV.
+        """
+        added = 0
+        block = []
+        for row in rows:
+            block.append(row)
+            if len(block) >= block_size:
+                added += self._insert(block)
+                block = []
+        if block:
+            added += self._insert(block)
+        return added
+
+    def _insert(self, block):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO work_queue (original_text, correct_label, text_hash) VALUES (?, ?, ?)", block
+            )
+            added = self.conn.total_changes - before
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def remaining(self):
+        """
+        Linhas da fila ainda sem resultado (reservadas ou não), sem contar as
+        que já esgotaram MAX_CLAIMS reservas e nunca mais serão reservadas.
+        """
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM work_queue q WHERE attempts < ? "
+            "AND NOT EXISTS (SELECT 1 FROM results r WHERE r.text_hash = q.text_hash)",
+            (MAX_CLAIMS,)
+        ).fetchone()[0]
+
+    def next_lease_expiry(self):
+        """
+        Menor lease_expires entre as linhas sem resultado reservadas por
+        outros workers e ainda retomáveis, ou None se não houver nenhuma.
+        As linhas deste worker ficam de fora: quem as termina é ele mesmo.
+        """
+        return self.conn.execute(
+            "SELECT MIN(lease_expires) FROM work_queue q WHERE lease_expires IS NOT NULL AND worker_id != ? "
+            "AND attempts < ? AND NOT EXISTS (SELECT 1 FROM results r WHERE r.text_hash = q.text_hash)",
+            (self.worker_id, MAX_CLAIMS)
+        ).fetchone()[0]
+
+    def claim(self, limit):
+        """
+        Reserva até `limit` linhas livres (nunca reservadas ou com lease
+        expirado) para este worker. Devolve [(texto, label, text_hash)].
+        """
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Linhas reservadas que já têm resultado saem da fila
+            self.conn.execute(
+                "DELETE FROM work_queue WHERE lease_expires IS NOT NULL "
+                "AND text_hash IN (SELECT text_hash FROM results)"
+            )
+            rows = self.conn.execute(
+                "SELECT original_text, correct_label, text_hash, lease_expires FROM work_queue q "
+                "WHERE (lease_expires IS NULL OR lease_expires < ?) AND attempts < ? "
+                "AND NOT EXISTS (SELECT 1 FROM results r WHERE r.text_hash = q.text_hash) "
+                "ORDER BY rowid LIMIT ?",
+                (now, MAX_CLAIMS, limit)
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE work_queue SET worker_id = ?, lease_expires = ?, attempts = attempts + 1 WHERE text_hash = ?",
+                [(self.worker_id, now + self.lease_seconds, hash_) for _, _, hash_, _ in rows]
+            )
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+        self.claimed += len(rows)
+        self.reclaimed += sum(1 for *_, lease_expires in rows if lease_expires is not None)
+        return [(text, label, hash_) for text, label, hash_, _ in rows]
+
+    def iter_claimed(self, block_size, idle=time.sleep):
+        """
+        Gera as linhas reservadas, reservando um novo bloco quando o anterior
+        acaba. Sem linhas livres, mas com linhas ainda reservadas por outros
+        workers, espera até o primeiro desses leases expirar (no máximo
+        LEASE_POLL_SECONDS por vez) e tenta de novo: se um worker caiu, suas
+        linhas são retomadas aqui. Só termina quando não sobra nada a reservar.
+        A espera é feita por `idle(segundos)`, para quem consome o gerador
+        poder tratar as próprias requisições em andamento nesse meio-tempo.
+        """
+        while True:
+            rows = self.claim(block_size)
+            if rows:
+                yield from rows
+                continue
+            if self.remaining() == 0:
+                return
+            expires = self.next_lease_expiry()
+            if expires is None:
+                # O que falta está reservado por este worker (em andamento ou na dead_letter)
+                return
+            idle(min(max(expires - time.time(), 0.1), LEASE_POLL_SECONDS))
+
+    def report(self):
+        print(f"Fila de trabalho ({self.worker_id}): {self.claimed} linhas reservadas, "
+              f"{self.reclaimed} retomadas de leases expirados.")
+
+    def close(self):
+        # Remove da fila as linhas cujo resultado já foi gravado
+        self.conn.execute("DELETE FROM work_queue WHERE text_hash IN (SELECT text_hash FROM results)")
+        self.conn.close()